@@ -1,105 +1,297 @@
+import io
 import os
-import json
+import sys
+import argparse
+import orjson
 from pathlib import Path
 from openai import OpenAI
 import librosa
 import librosa.display
 import numpy as np
-from pydub import AudioSegment
-import matplotlib.pyplot as plt
+from numba import njit
+import soundfile as sf
+import matplotlib
+matplotlib.use("Agg")
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 from datetime import datetime
+import threading
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor
 
-def extract_and_analyze_specific_segment(vocals_path, start_time, end_time, output_dir, target_lyrics):
+# Set USE_LOCAL_WHISPER=1 to transcribe locally with faster-whisper instead of the OpenAI API
+USE_LOCAL_WHISPER = os.getenv("USE_LOCAL_WHISPER", "").lower() in ("1", "true", "yes")
+LOCAL_WHISPER_MODEL = os.getenv("LOCAL_WHISPER_MODEL", "base")
+
+_local_whisper_model = None
+_local_whisper_lock = threading.Lock()
+
+# Background visualization renders, joined by wait_for_visualizations()
+_render_threads = []
+_print_lock = threading.Lock()
+
+
+def get_local_whisper_model():
+    """
+    Load the faster-whisper (CTranslate2 int8) model once and reuse it.
+    """
+    global _local_whisper_model
+    with _local_whisper_lock:
+        if _local_whisper_model is None:
+            from faster_whisper import WhisperModel
+            print(f"Loading faster-whisper model '{LOCAL_WHISPER_MODEL}' (int8)...")
+            _local_whisper_model = WhisperModel(LOCAL_WHISPER_MODEL, device="auto", compute_type="int8")
+    return _local_whisper_model
+
+
+def transcribe_segment_local(wav_bytes):
+    """
+    Transcribe in-memory WAV bytes with faster-whisper, returning the same shape
+    as the OpenAI verbose_json response (text, words, language).
+    """
+    model = get_local_whisper_model()
+    segments, info = model.transcribe(io.BytesIO(wav_bytes), word_timestamps=True, vad_filter=True)
+    segments = list(segments)
+    
+    return SimpleNamespace(
+        text="".join(seg.text for seg in segments).strip(),
+        words=[word for seg in segments for word in (seg.words or [])],
+        language=info.language
+    )
+
+
+def transcribe_segment(wav_bytes, filename):
+    """
+    Transcribe in-memory WAV bytes with Whisper, requesting word-level timestamps.
+    """
+    if USE_LOCAL_WHISPER:
+        return transcribe_segment_local(wav_bytes)
+    
+    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    
+    return client.audio.transcriptions.create(
+        model="whisper-1",
+        file=(filename, wav_bytes),
+        response_format="verbose_json",
+        timestamp_granularities=["word"]
+    )
+
+
+def render_visualization(y, sr, D, n_fft, hop_length, rms_times, rms_db, word_timings_dual, start_time, end_time, viz_path, log=print):
+    """
+    Render waveform, spectrogram and energy plots to a PNG.
+    Builds its own Figure (no pyplot state) so it can run on a worker thread.
+    """
+    dpi = 150
+    fig = Figure(figsize=(14, 8))
+    FigureCanvasAgg(fig)
+    
+    # Subplot 1: Waveform (capped at ~2 envelope points per horizontal pixel)
+    ax = fig.add_subplot(3, 1, 1)
+    max_points = int(fig.get_figwidth() * dpi * 2)
+    librosa.display.waveshow(y, sr=sr, max_points=max_points, alpha=0.6, color='blue', ax=ax)
+    ax.set_title(f"Vocal Segment: {start_time:.0f}s-{end_time:.0f}s (Absolute Time)", fontweight='bold')
+    for word in word_timings_dual:
+        ax.axvline(word['time_relative']['start'], color='red', linestyle='--', alpha=0.5, linewidth=1)
+    ax.set_ylabel("Amplitude")
+    
+    # Subplot 2: Spectrogram
+    ax = fig.add_subplot(3, 1, 2)
+    img = librosa.display.specshow(D, sr=sr, hop_length=hop_length, n_fft=n_fft, x_axis='time', y_axis='hz', ax=ax)
+    fig.colorbar(img, ax=ax, format='%+2.0f dB')
+    ax.set_title("Spectrogram with Word Boundaries", fontweight='bold')
+    ax.set_ylim(0, 3000)
+    
+    # Subplot 3: Energy
+    ax = fig.add_subplot(3, 1, 3)
+    ax.plot(rms_times, rms_db, color='purple', linewidth=1.5)
+    ax.set_title("Energy (RMS) Over Time", fontweight='bold')
+    ax.set_xlabel("Time (s) - Relative")
+    ax.set_ylabel("Energy (dB)")
+    ax.grid(alpha=0.3)
+    
+    fig.tight_layout()
+    fig.savefig(str(viz_path), dpi=dpi)
+    
+    log(f"✓ Visualization saved: {viz_path.name}")
+
+
+def prefixed_logger(prefix):
+    """
+    print() replacement for concurrent segment workers. Every line is tagged
+    with prefix and written in one locked call, so workers don't garble each other.
+    """
+    def log(*args, sep=" ", end="\n"):
+        text = sep.join(str(a) for a in args)
+        tagged = "\n".join(f"{prefix} {line}" if line else line for line in text.split("\n"))
+        with _print_lock:
+            sys.stdout.write(tagged + end)
+    return log
+
+
+def wait_for_visualizations():
+    """
+    Block until every background visualization has been written.
+    """
+    while _render_threads:
+        _render_threads.pop().join()
+
+
+@njit(cache=True)
+def mean_over_ranges(times, values, starts, ends):
+    """
+    Average `values` over each inclusive [start, end] window of the sorted `times` axis.
+    Returns (means, counts); means are NaN where a window holds no samples.
+    Compiled with numba so no per-word temporaries are allocated.
+    """
+    n = starts.shape[0]
+    means = np.full(n, np.nan)
+    counts = np.zeros(n, dtype=np.int64)
+    
+    for w in range(n):
+        lo = np.searchsorted(times, starts[w], side='left')
+        hi = np.searchsorted(times, ends[w], side='right')
+        total = 0.0
+        for i in range(lo, hi):
+            total += values[i]
+        if hi > lo:
+            counts[w] = hi - lo
+            means[w] = total / (hi - lo)
+    
+    return means, counts
+
+
+def extract_and_analyze_specific_segment(vocals_path, start_time, end_time, output_dir, target_lyrics, track_beats=False, log=print):
     """
     Extract a specific segment and analyze with dual time frames:
     1. Relative time (0-based within segment)
     2. Absolute time (position in original file)
-    """
-    
-    print("="*70)
-    print("EXTRACTING SPECIFIC VOCAL SEGMENT")
-    print("="*70)
-    print(f"Source: {vocals_path}")
-    print(f"Time range: {start_time:.2f}s - {end_time:.2f}s")
-    print(f"Duration: {end_time - start_time:.2f}s")
-    print(f"Target lyrics: {target_lyrics}")
     
-    # Extract segment
-    audio = AudioSegment.from_wav(vocals_path)
-    segment = audio[start_time * 1000:end_time * 1000]
+    Tempo is always estimated; beat positions (beat_times_relative) are only
+    tracked when track_beats=True, since nothing downstream consumes them.
+    Progress goes through log (print by default).
+    """
     
+    log("="*70)
+    log("EXTRACTING SPECIFIC VOCAL SEGMENT")
+    log("="*70)
+    log(f"Source: {vocals_path}")
+    log(f"Time range: {start_time:.2f}s - {end_time:.2f}s")
+    log(f"Duration: {end_time - start_time:.2f}s")
+    log(f"Target lyrics: {target_lyrics}")
+    
+    # Extract segment: seek and decode only the requested frames, so memory
+    # stays constant no matter how long the source file is
+    with sf.SoundFile(vocals_path) as f:
+        sr = f.samplerate
+        f.seek(int(start_time * sr))
+        y = f.read(int((end_time - start_time) * sr), dtype='float32')
+    
+    # Downmix to mono for analysis (librosa.load did this implicitly)
+    if y.ndim > 1:
+        y = y.mean(axis=1)
+    
+    # Keep the whole analysis in float32 (complex64 STFT): half the memory traffic of float64
+    y = y.astype(np.float32, copy=False)
+    
+    # Encode the WAV once in memory: Whisper gets the bytes directly and the
+    # same bytes are saved as the segment artifact (no write-then-reread)
     segment_path = output_dir / f"segment_{start_time:.0f}-{end_time:.0f}s.wav"
-    segment.export(str(segment_path), format="wav")
+    wav_buffer = io.BytesIO()
+    sf.write(wav_buffer, y, sr, subtype='PCM_16', format='WAV')
+    wav_bytes = wav_buffer.getvalue()
+    
+    # Start the Whisper request now so its network latency overlaps the DSP below
+    executor = ThreadPoolExecutor(max_workers=1)
+    transcription_future = executor.submit(transcribe_segment, wav_bytes, segment_path.name)
+    executor.shutdown(wait=False)
     
-    print(f"✓ Extracted segment: {segment_path.name}")
+    segment_path.write_bytes(wav_bytes)
+    log(f"✓ Extracted segment: {segment_path.name}")
     
     # Analyze the segment
-    print("\n" + "="*70)
-    print("ANALYZING SEGMENT AUDIO")
-    print("="*70)
+    log("\n" + "="*70)
+    log("ANALYZING SEGMENT AUDIO")
+    log("="*70)
     
-    y, sr = librosa.load(str(segment_path), sr=None)
     duration = librosa.get_duration(y=y, sr=sr)
     
-    # Tempo and beat
-    tempo, beats = librosa.beat.beat_track(y=y, sr=sr)
-    if isinstance(tempo, np.ndarray):
-        tempo = float(tempo.item()) if tempo.size == 1 else float(tempo[0])
-    else:
-        tempo = float(tempo)
-    
-    beat_times = librosa.frames_to_time(beats, sr=sr)
-    
-    print(f"Duration: {duration:.2f}s")
-    print(f"Tempo: {tempo:.1f} BPM")
-    print(f"Beats: {len(beat_times)}")
+    # Shared spectrogram: one STFT feeds every feature below
+    n_fft = 2048
+    hop_length = 512
+    S = np.abs(librosa.stft(y, n_fft=n_fft, hop_length=hop_length, dtype=np.complex64))
+    P = S**2  # power spectrogram, shared by the mel bands and the plot
+    mel = librosa.feature.melspectrogram(S=P, sr=sr)
+    mel_db = librosa.power_to_db(mel)
+    onset_env = librosa.onset.onset_strength(S=mel_db, sr=sr)
+    # beat_track(y=y) builds its envelope with a median across mel bands
+    beat_env = librosa.onset.onset_strength(S=mel_db, sr=sr, aggregate=np.median)
+    
+    # Tempo (autocorrelation only - skips beat_track's dynamic-programming pass)
+    tempo = float(librosa.feature.tempo(onset_envelope=beat_env, sr=sr, hop_length=hop_length)[0])
+    
+    log(f"Duration: {duration:.2f}s")
+    log(f"Tempo: {tempo:.1f} BPM")
+    
+    beat_times = None
+    if track_beats:
+        _, beats = librosa.beat.beat_track(onset_envelope=beat_env, sr=sr, hop_length=hop_length, bpm=tempo)
+        beat_times = librosa.frames_to_time(beats, sr=sr, hop_length=hop_length)
+        log(f"Beats: {len(beat_times)}")
     
     # Onset detection
-    onset_frames = librosa.onset.onset_detect(y=y, sr=sr, wait=1, pre_avg=1, post_avg=1, pre_max=1, post_max=1)
-    onset_times_relative = librosa.frames_to_time(onset_frames, sr=sr)
+    onset_frames = librosa.onset.onset_detect(onset_envelope=onset_env, sr=sr, hop_length=hop_length,
+                                              wait=1, pre_avg=1, post_avg=1, pre_max=1, post_max=1)
+    onset_times_relative = librosa.frames_to_time(onset_frames, sr=sr, hop_length=hop_length)
     
-    print(f"Onsets detected: {len(onset_times_relative)}")
+    log(f"Onsets detected: {len(onset_times_relative)}")
     
     # Energy analysis
-    hop_length = 512
-    rms = librosa.feature.rms(y=y, hop_length=hop_length)[0]
+    # Frame RMS straight from the power spectrogram via Parseval (same as
+    # librosa.feature.rms(S=S), without re-squaring S): DC and Nyquist bins count once
+    rms = np.sqrt((2 * P.sum(axis=0) - P[0] - P[-1]) / n_fft**2)
     rms_times = librosa.frames_to_time(np.arange(len(rms)), sr=sr, hop_length=hop_length)
     rms_db = librosa.amplitude_to_db(rms, ref=np.max)
     
-    # Pitch analysis
-    pitches, magnitudes = librosa.piptrack(y=y, sr=sr)
-    pitch_contour = []
+    # Pitch analysis (restricted to the singing-voice band)
+    fmin, fmax = 50.0, 1500.0
+    pitches, magnitudes = librosa.piptrack(S=S, sr=sr, n_fft=n_fft, hop_length=hop_length, fmin=fmin, fmax=fmax)
     times = librosa.frames_to_time(np.arange(pitches.shape[1]), sr=sr, hop_length=hop_length)
     
-    for t in range(pitches.shape[1]):
-        index = magnitudes[:, t].argmax()
-        pitch = pitches[index, t]
-        if pitch > 0:
-            pitch_contour.append({"time_relative": float(times[t]), "pitch_hz": float(pitch)})
+    # Bins above fmax are always zero, so only search the rows inside the band
+    n_bins = min(int(np.ceil(fmax * n_fft / sr)) + 1, pitches.shape[0])
+    pitches, magnitudes = pitches[:n_bins], magnitudes[:n_bins]
     
-    # Transcribe with Whisper
-    print("\n" + "="*70)
-    print("TRANSCRIBING WITH WORD TIMESTAMPS")
-    print("="*70)
+    # Strongest bin per frame, keeping only voiced frames
+    pitch_vec = pitches[magnitudes.argmax(axis=0), np.arange(pitches.shape[1])]
+    voiced = pitch_vec > 0
+    pitch_times = times[voiced]
+    pitch_values = pitch_vec[voiced]
     
-    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    # Transcribe with Whisper
+    log("\n" + "="*70)
+    log("TRANSCRIBING WITH WORD TIMESTAMPS")
+    log("="*70)
     
-    with open(str(segment_path), "rb") as audio_file:
-        transcription = client.audio.transcriptions.create(
-            model="whisper-1",
-            file=audio_file,
-            response_format="verbose_json",
-            timestamp_granularities=["word"]
-        )
+    transcription = transcription_future.result()
     
-    print(f"Transcribed: {transcription.text}")
+    log(f"Transcribed: {transcription.text}")
     
     # Build dual time frame word data
     word_timings_dual = []
     
     if hasattr(transcription, 'words') and transcription.words:
-        print(f"\n{'#':<4} {'Word':<15} {'Relative':<20} {'Absolute':<20}")
-        print("-"*70)
+        log(f"\n{'#':<4} {'Word':<15} {'Relative':<20} {'Absolute':<20}")
+        log("-"*70)
+        
+        # Per-word pitch and energy averages for every word at once
+        word_starts = np.array([float(w.start) for w in transcription.words])
+        word_ends = np.array([float(w.end) for w in transcription.words])
+        avg_pitches, pitch_counts = mean_over_ranges(pitch_times, pitch_values, word_starts, word_ends)
+        avg_energies, energy_counts = mean_over_ranges(rms_times, rms_db, word_starts, word_ends)
+        
+        word_timings_dual = [None] * len(transcription.words)
+        table_lines = [None] * len(transcription.words)
         
         for i, word in enumerate(transcription.words):
             time_relative_start = float(word.start)
@@ -125,20 +317,18 @@ def extract_and_analyze_specific_segment(vocals_path, start_time, end_time, outp
             }
             
             # Add pitch and energy
-            word_pitches = [p['pitch_hz'] for p in pitch_contour 
-                          if time_relative_start <= p['time_relative'] <= time_relative_end]
-            if word_pitches:
-                word_data['avg_pitch_hz'] = float(np.mean(word_pitches))
-            
-            energy_mask = (rms_times >= time_relative_start) & (rms_times <= time_relative_end)
-            if np.any(energy_mask):
-                word_data['avg_energy_db'] = float(np.mean(rms_db[energy_mask]))
+            if pitch_counts[i] > 0:
+                word_data['avg_pitch_hz'] = float(avg_pitches[i])
             
-            word_timings_dual.append(word_data)
+            if energy_counts[i] > 0:
+                word_data['avg_energy_db'] = float(avg_energies[i])
             
-            print(f"{i+1:<4} {word.word:<15} "
-                  f"{time_relative_start:.2f}-{time_relative_end:.2f}s    "
-                  f"{time_absolute_start:.2f}-{time_absolute_end:.2f}s")
+            word_timings_dual[i] = word_data
+            table_lines[i] = (f"{i+1:<4} {word.word:<15} "
+                              f"{time_relative_start:.2f}-{time_relative_end:.2f}s    "
+                              f"{time_absolute_start:.2f}-{time_absolute_end:.2f}s")
+        
+        log("\n".join(table_lines))
     
     # Create analysis report
     analysis_data = {
@@ -156,9 +346,11 @@ def extract_and_analyze_specific_segment(vocals_path, start_time, end_time, outp
             "duration": float(duration),
             "sample_rate": int(sr),
             "tempo": tempo,
-            "beat_times_relative": beat_times.tolist(),
-            "onset_times_relative": onset_times_relative.tolist(),
-            "pitch_contour": pitch_contour[:100]  # Limit for JSON size
+            "onset_times_relative": onset_times_relative,
+            "pitch_contour": [
+                {"time_relative": float(t), "pitch_hz": float(p)}
+                for t, p in zip(pitch_times[:100], pitch_values[:100])  # Limit for JSON size
+            ]
         },
         "transcription": {
             "full_text": transcription.text,
@@ -168,61 +360,61 @@ def extract_and_analyze_specific_segment(vocals_path, start_time, end_time, outp
         "note": "Dual time frames: 'relative' is 0-based within segment, 'absolute' is position in original file for merging"
     }
     
+    if beat_times is not None:
+        analysis_data['audio_analysis']['beat_times_relative'] = beat_times
+    
     # Save analysis
     analysis_path = output_dir / f"analysis_{start_time:.0f}-{end_time:.0f}s.json"
-    with open(analysis_path, 'w', encoding='utf-8') as f:
-        json.dump(analysis_data, f, indent=2, ensure_ascii=False)
-    
-    print(f"\n✓ Analysis saved: {analysis_path.name}")
+    analysis_path.write_bytes(orjson.dumps(analysis_data, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY))
     
-    # Create visualization
-    print("\n" + "="*70)
-    print("CREATING VISUALIZATION")
-    print("="*70)
+    log(f"\n✓ Analysis saved: {analysis_path.name}")
     
-    plt.figure(figsize=(14, 8))
+    # Create visualization in the background so returning isn't stalled on rasterization
+    log("\n" + "="*70)
+    log("CREATING VISUALIZATION")
+    log("="*70)
     
-    # Subplot 1: Waveform
-    plt.subplot(3, 1, 1)
-    librosa.display.waveshow(y, sr=sr, alpha=0.6, color='blue')
-    plt.title(f"Vocal Segment: {start_time:.0f}s-{end_time:.0f}s (Absolute Time)", fontweight='bold')
-    for word in word_timings_dual:
-        plt.axvline(word['time_relative']['start'], color='red', linestyle='--', alpha=0.5, linewidth=1)
-    plt.ylabel("Amplitude")
-    
-    # Subplot 2: Spectrogram
-    plt.subplot(3, 1, 2)
-    D = librosa.amplitude_to_db(np.abs(librosa.stft(y)), ref=np.max)
-    librosa.display.specshow(D, sr=sr, x_axis='time', y_axis='hz')
-    plt.colorbar(format='%+2.0f dB')
-    plt.title("Spectrogram with Word Boundaries", fontweight='bold')
-    plt.ylim(0, 3000)
-    
-    # Subplot 3: Energy
-    plt.subplot(3, 1, 3)
-    plt.plot(rms_times, rms_db, color='purple', linewidth=1.5)
-    plt.title("Energy (RMS) Over Time", fontweight='bold')
-    plt.xlabel("Time (s) - Relative")
-    plt.ylabel("Energy (dB)")
-    plt.grid(alpha=0.3)
-    
-    plt.tight_layout()
+    D = librosa.power_to_db(P, ref=np.max)
     viz_path = output_dir / f"visualization_{start_time:.0f}-{end_time:.0f}s.png"
-    plt.savefig(str(viz_path), dpi=150)
-    plt.close()
     
-    print(f"✓ Visualization saved: {viz_path.name}")
+    render_thread = threading.Thread(
+        target=render_visualization,
+        args=(y, sr, D, n_fft, hop_length, rms_times, rms_db, word_timings_dual, start_time, end_time, viz_path, log)
+    )
+    render_thread.start()
+    _render_threads.append(render_thread)
     
     return analysis_data
 
 
+# Configured segments: (start seconds, end seconds, target lyrics)
+SEGMENTS = [
+    (6.0, 23.0, "Part 1: 4 lines (0:06 to 0:23) - Pegue minha mão, vem cá / Um segredo vou te contar / Com giramila vem dançar / Num castelo vem brincar"),
+    (22.0, 36.0, "Part 2: 4 lines (Não terá rainha má / Nem bruxa pra espantar / Ser amiga, ser feliz / Vem, vamos nos divertir)"),
+    (35.0, 53.0, "Part 3: 4 lines (Com a giramila juntos caminhar / Vamos perceber / Como é bom sonhar / E ver o sol brilhar)"),
+    (52.0, 70.0, "Part 4: 5 lines (0:52 to 1:10) - As flores nós vamos regar / E assistir crescer / Com a amizade que eu sinto / Só eu e você / Amigos para sempre vamos ser"),
+    (79.0, 93.0, "Part 5: 4 lines (1:19 to 1:33) - Pegue minha mão, vem cá / O segredo vou te contar / Com giramila e vem dançar / Num castelo vem brincar"),
+    (93.0, 107.0, "Part 6: 4 lines (1:33 to 1:47) - Não terá rainha má / Nem bruxa pra espantar / Ser amiga, ser feliz / Vem, vamos nos divertir"),
+]
+
+# Target segment parameters - PART 6 (the default single-segment run)
+DEFAULT_SEGMENT = SEGMENTS[5]
+
+
 def main():
+    parser = argparse.ArgumentParser(description="Analyze a vocal segment with dual time frames.")
+    parser.add_argument("--all", action="store_true",
+                        help=f"Analyze all {len(SEGMENTS)} configured segments concurrently "
+                             f"(one Whisper request per segment)")
+    args = parser.parse_args()
+    
     workspace_root = Path(__file__).parent
     
-    # Check API key
-    if not os.getenv("OPENAI_API_KEY"):
+    # Check API key (not needed for local transcription)
+    if not USE_LOCAL_WHISPER and not os.getenv("OPENAI_API_KEY"):
         print("ERROR: OPENAI_API_KEY environment variable not set!")
         print("Please set it using: $env:OPENAI_API_KEY='your-api-key-here'")
+        print("Or transcribe locally with faster-whisper: $env:USE_LOCAL_WHISPER='1'")
         return
     
     # Input
@@ -232,48 +424,63 @@ def main():
         print(f"ERROR: Vocals file not found at {vocals_file}")
         return
     
-    # Create timestamped output folder
+    # Create timestamped output folder(s)
     timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-    output_dir = workspace_root / "data" / "analysis" / f"segment_analysis_{timestamp}"
-    os.makedirs(output_dir, exist_ok=True)
-    
-    # Target segment parameters - PART 6
-    START_TIME = 93.0   # Starts at 1:33 (93 seconds)
-    END_TIME = 107.0    # Ends at 1:47 (107 seconds)
-    TARGET_LYRICS = "Part 6: 4 lines (1:33 to 1:47) - Não terá rainha má / Nem bruxa pra espantar / Ser amiga, ser feliz / Vem, vamos nos divertir"
+    analysis_base = workspace_root / "data" / "analysis"
+    segments = SEGMENTS if args.all else [DEFAULT_SEGMENT]
+    
+    def analyze(segment, log=print):
+        start_time, end_time, target_lyrics = segment
+        # Concurrent runs share a timestamp, so their folders carry the range too
+        suffix = f"_{start_time:.0f}-{end_time:.0f}s" if args.all else ""
+        output_dir = analysis_base / f"segment_analysis_{timestamp}{suffix}"
+        os.makedirs(output_dir, exist_ok=True)
+        analysis_data = extract_and_analyze_specific_segment(
+            vocals_path=str(vocals_file),
+            start_time=start_time,
+            end_time=end_time,
+            output_dir=output_dir,
+            target_lyrics=target_lyrics,
+            log=log
+        )
+        return output_dir, analysis_data
     
     print("\n" + "="*70)
     print("SPECIFIC SEGMENT ANALYSIS WITH DUAL TIME FRAMES")
     print("="*70)
-    print(f"Output folder: {output_dir.name}\n")
-    
-    # Extract and analyze
-    analysis_data = extract_and_analyze_specific_segment(
-        vocals_path=str(vocals_file),
-        start_time=START_TIME,
-        end_time=END_TIME,
-        output_dir=output_dir,
-        target_lyrics=TARGET_LYRICS
-    )
+    
+    if args.all:
+        print(f"Segments: {len(segments)}\n")
+        # Whisper requests overlap, and librosa's FFT/numba kernels release the GIL.
+        # Each worker's lines are tagged with its range so the output stays readable.
+        max_workers = min(len(segments), os.cpu_count() or 1, 8)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(analyze, seg, prefixed_logger(f"[{seg[0]:.0f}-{seg[1]:.0f}s]"))
+                       for seg in segments]
+            results = [future.result() for future in futures]
+    else:
+        print(f"Output folder: segment_analysis_{timestamp}\n")
+        results = [analyze(segments[0])]
     
     # Summary
     print("\n" + "="*70)
     print("✓ ANALYSIS COMPLETE!")
     print("="*70)
     print(f"\n📊 Summary:")
-    print(f"   Segment: {START_TIME:.0f}s - {END_TIME:.0f}s (duration: {END_TIME - START_TIME:.0f}s)")
-    print(f"   Words transcribed: {len(analysis_data['transcription']['word_timings_dual_frame'])}")
-    print(f"   Tempo: {analysis_data['audio_analysis']['tempo']:.1f} BPM")
-    print(f"\n📁 Output:")
-    print(f"   Folder: {output_dir}")
-    print(f"   Segment audio: segment_{START_TIME:.0f}-{END_TIME:.0f}s.wav")
-    print(f"   Analysis data: analysis_{START_TIME:.0f}-{END_TIME:.0f}s.json")
-    print(f"   Visualization: visualization_{START_TIME:.0f}-{END_TIME:.0f}s.png")
+    for (start_time, end_time, _), (output_dir, analysis_data) in zip(segments, results):
+        print(f"\n   Segment: {start_time:.0f}s - {end_time:.0f}s (duration: {end_time - start_time:.0f}s)")
+        print(f"   Words transcribed: {len(analysis_data['transcription']['word_timings_dual_frame'])}")
+        print(f"   Tempo: {analysis_data['audio_analysis']['tempo']:.1f} BPM")
+        print(f"   Folder: {output_dir}")
+        print(f"   Segment audio: segment_{start_time:.0f}-{end_time:.0f}s.wav")
+        print(f"   Analysis data: analysis_{start_time:.0f}-{end_time:.0f}s.json")
+        print(f"   Visualization: visualization_{start_time:.0f}-{end_time:.0f}s.png")
     print(f"\n✓ Dual time frames recorded:")
     print(f"   - Relative (0-based): For TTS generation")
     print(f"   - Absolute (original position): For merging with background music")
     print("="*70)
-
+    
+    wait_for_visualizations()
 
 if __name__ == "__main__":
     main()
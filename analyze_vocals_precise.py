@@ -1,14 +1,33 @@
 import os
-import json
+import argparse
+import orjson
 from pathlib import Path
 from openai import OpenAI
 import librosa
 import librosa.display
 import numpy as np
 import soundfile as sf
-from pydub import AudioSegment
+import soxr
+from numba import njit
+import matplotlib
+matplotlib.use("Agg")  # Headless renderer; plots are only saved to disk
 import matplotlib.pyplot as plt
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+def fast_load(path, target_sr=None):
+    """
+    Load audio as mono float32 via soundfile, resampling with soxr only
+    when target_sr differs from the file's native rate.
+    """
+    data, sr = sf.read(path, dtype='float32', always_2d=False)
+    if data.ndim > 1:
+        data = data.mean(axis=1)
+    if target_sr and sr != target_sr:
+        data = soxr.resample(data, sr, target_sr)
+        sr = target_sr
+    return data, sr
+
 
 def auto_detect_vocal_region(input_audio, min_duration=15, max_duration=25):
     """
@@ -24,7 +43,9 @@ def auto_detect_vocal_region(input_audio, min_duration=15, max_duration=25):
     """
     print("\n🔍 Auto-detecting vocal region...")
     
-    y, sr = librosa.load(input_audio, sr=16000)
+    # The threshold and the end-time clamps depend on the whole track, so it
+    # is always scanned in full (a leading window picks the intro instead)
+    y, sr = fast_load(input_audio, target_sr=16000)
     
     # Compute energy
     energy = librosa.feature.rms(y=y, hop_length=512)[0]
@@ -65,22 +86,72 @@ def extract_segment(input_audio, start_sec, end_sec, output_path):
         end_sec: End time in seconds
         output_path: Where to save the extracted segment
     """
-    audio = AudioSegment.from_wav(input_audio)
-    segment = audio[start_sec * 1000:end_sec * 1000]
-    segment.export(output_path, format="wav")
+    # Seek straight to the segment instead of decoding the whole file
+    with sf.SoundFile(input_audio) as f:
+        sr = f.samplerate
+        subtype = f.subtype
+        f.seek(int(start_sec * sr))
+        segment = f.read(frames=int(end_sec * sr) - int(start_sec * sr), dtype='float32')
+    sf.write(output_path, segment, sr, subtype=subtype)
     print(f"✓ Extracted segment: {start_sec:.2f}s to {end_sec:.2f}s -> {output_path}")
     return output_path
 
 
+# Note name for every MIDI number, so conversions are a table lookup
+NOTE_NAMES = np.array(librosa.midi_to_note(np.arange(128)))
+
+
+def hz_to_midi_notes(freqs):
+    """
+    Vectorized Hz -> nearest MIDI note number.
+    Returns (midi, valid) where valid marks frequencies in the (0, 8000] Hz range.
+    """
+    freqs = np.asarray(freqs, dtype=np.float64)
+    valid = (freqs > 0) & (freqs <= 8000)
+    midi = np.zeros(freqs.shape, dtype=np.int64)
+    midi[valid] = np.clip(np.round(12 * np.log2(freqs[valid] / 440.0) + 69), 0, 127)
+    return midi, valid
+
+
 def hz_to_note(freq):
     """Convert frequency in Hz to musical note name."""
-    if freq <= 0 or freq > 8000:
-        return None
-    try:
-        note = librosa.hz_to_note(freq)
-        return note
-    except:
-        return None
+    midi, valid = hz_to_midi_notes(freq)
+    return str(NOTE_NAMES[midi]) if valid else None
+
+
+# Vocal content sits well below 11 kHz, so features are computed at 22.05 kHz
+ANALYSIS_SR = 22050
+
+
+@njit(cache=True)
+def _find_gaps(silence_mask, times, min_dur):
+    """
+    Single pass over the silence mask: a gap opens on the first silent frame
+    and closes on the next non-silent one. Keeps gaps longer than min_dur;
+    a gap still open at the end is dropped. Returns (starts, ends) in seconds.
+    """
+    starts = np.empty(silence_mask.shape[0], dtype=times.dtype)
+    ends = np.empty(silence_mask.shape[0], dtype=times.dtype)
+    n = 0
+    in_gap = False
+    gap_start = 0.0
+    
+    for i in range(silence_mask.shape[0]):
+        if silence_mask[i] and not in_gap:
+            in_gap = True
+            gap_start = times[i]
+        elif not silence_mask[i] and in_gap:
+            in_gap = False
+            if times[i] - gap_start > min_dur:
+                starts[n] = gap_start
+                ends[n] = times[i]
+                n += 1
+    
+    return starts[:n], ends[:n]
+
+
+# Compile (or load from the numba cache) at import rather than mid-analysis
+_find_gaps(np.zeros(0, dtype=np.bool_), np.zeros(0, dtype=np.float64), 0.0)
 
 
 def analyze_audio_detailed(audio_path):
@@ -91,19 +162,32 @@ def analyze_audio_detailed(audio_path):
     print("DETAILED AUDIO ANALYSIS")
     print("="*70)
     
-    # Load audio
-    y, sr = librosa.load(audio_path, sr=None)
+    # Load audio at the analysis rate; word clips are still cut from the native-rate file
+    source_sr = sf.info(audio_path).samplerate
+    y, sr = fast_load(audio_path, target_sr=ANALYSIS_SR)
     duration = librosa.get_duration(y=y, sr=sr)
     
     print(f"\n📊 Basic Info:")
     print(f"   Duration: {duration:.3f} seconds")
-    print(f"   Sample Rate: {sr} Hz")
+    print(f"   Sample Rate: {sr} Hz (source: {source_sr} Hz)")
     print(f"   Total Samples: {len(y)}")
     
+    # Shared spectrogram: one STFT feeds every feature below
+    n_fft = 2048
+    hop_length = 512
+    S = np.abs(librosa.stft(y, n_fft=n_fft, hop_length=hop_length))
+    P = S**2
+    # Frame timestamps shared by the pitch, energy and gap analysis below
+    frame_times = np.arange(S.shape[1]) * (hop_length / sr)
+    mel_db = librosa.power_to_db(librosa.feature.melspectrogram(S=P, sr=sr))
+    onset_env = librosa.onset.onset_strength(S=mel_db, sr=sr)
+    # beat_track(y=y) builds its envelope with a median across mel bands
+    beat_env = librosa.onset.onset_strength(S=mel_db, sr=sr, aggregate=np.median)
+    
     # Tempo and beat analysis
     print(f"\n🎵 Rhythm Analysis:")
-    tempo, beats = librosa.beat.beat_track(y=y, sr=sr)
-    beat_times = librosa.frames_to_time(beats, sr=sr)
+    tempo, beats = librosa.beat.beat_track(onset_envelope=beat_env, sr=sr, hop_length=hop_length)
+    beat_times = librosa.frames_to_time(beats, sr=sr, hop_length=hop_length)
     
     # Ensure tempo is a scalar value
     if isinstance(tempo, np.ndarray):
@@ -117,37 +201,34 @@ def analyze_audio_detailed(audio_path):
     
     # Pitch/frequency analysis
     print(f"\n🎼 Pitch Analysis:")
-    pitches, magnitudes = librosa.piptrack(y=y, sr=sr)
+    # Restrict candidates to the singing range (C2-C6) to drop spurious high-frequency picks
+    fmin, fmax = librosa.note_to_hz('C2'), librosa.note_to_hz('C6')
+    pitches, magnitudes = librosa.piptrack(S=S, sr=sr, n_fft=n_fft, hop_length=hop_length, fmin=fmin, fmax=fmax)
     
-    # Get pitch contour over time
-    pitch_contour = []
-    hop_length = 512
-    times = librosa.frames_to_time(np.arange(pitches.shape[1]), sr=sr, hop_length=hop_length)
+    # Bins above fmax are always zero, so only search the rows inside the band
+    n_bins = min(int(np.ceil(fmax * n_fft / sr)) + 1, pitches.shape[0])
+    pitches, magnitudes = pitches[:n_bins], magnitudes[:n_bins]
     
-    for t in range(pitches.shape[1]):
-        index = magnitudes[:, t].argmax()
-        pitch = pitches[index, t]
-        if pitch > 0:
-            pitch_contour.append({"time": float(times[t]), "pitch_hz": float(pitch)})
+    # Get pitch contour over time: strongest bin per frame, voiced frames only
+    pitch_per_frame = pitches[magnitudes.argmax(axis=0), np.arange(pitches.shape[1])]
+    voiced = pitch_per_frame > 0
+    pitch_times = frame_times[voiced]
+    pitch_hz = pitch_per_frame[voiced]
     
     # Convert pitches to musical notes
-    notes = []
     note_histogram = {}
     
-    if pitch_contour:
-        avg_pitch = np.mean([p['pitch_hz'] for p in pitch_contour])
-        min_pitch = np.min([p['pitch_hz'] for p in pitch_contour])
-        max_pitch = np.max([p['pitch_hz'] for p in pitch_contour])
-        print(f"   Average Pitch: {avg_pitch:.2f} Hz")
-        print(f"   Pitch Range: {min_pitch:.2f} Hz - {max_pitch:.2f} Hz")
-        print(f"   Pitch Contour Points: {len(pitch_contour)}")
+    if pitch_hz.size:
+        print(f"   Average Pitch: {pitch_hz.mean():.2f} Hz")
+        print(f"   Pitch Range: {pitch_hz.min():.2f} Hz - {pitch_hz.max():.2f} Hz")
+        print(f"   Pitch Contour Points: {pitch_hz.size}")
         
-        # Extract musical notes
-        for p in pitch_contour:
-            note = hz_to_note(p['pitch_hz'])
-            if note:
-                notes.append(note)
-                note_histogram[note] = note_histogram.get(note, 0) + 1
+        # Extract musical notes: one vectorized conversion, then count per MIDI number
+        midi, valid = hz_to_midi_notes(pitch_hz)
+        note_ids, first_seen, counts = np.unique(midi[valid], return_index=True, return_counts=True)
+        # Most frequent first; ties keep first-occurrence order
+        for k in np.lexsort((first_seen, -counts)):
+            note_histogram[str(NOTE_NAMES[note_ids[k]])] = int(counts[k])
         
         if note_histogram:
             dominant_notes = sorted(note_histogram.items(), key=lambda x: -x[1])[:5]
@@ -156,28 +237,24 @@ def analyze_audio_detailed(audio_path):
     # Onset detection (word/syllable boundaries)
     print(f"\n🔊 Onset Detection (Word/Syllable Boundaries):")
     onset_frames = librosa.onset.onset_detect(
-        y=y, sr=sr, 
+        onset_envelope=onset_env, sr=sr, hop_length=hop_length,
         wait=1, pre_avg=1, post_avg=1, 
         pre_max=1, post_max=1
     )
-    onset_times = librosa.frames_to_time(onset_frames, sr=sr)
-    onset_strengths = librosa.onset.onset_strength(y=y, sr=sr)
+    onset_times = librosa.frames_to_time(onset_frames, sr=sr, hop_length=hop_length)
     
     print(f"   Detected onsets: {len(onset_times)}")
     print(f"   Onset times: {onset_times.tolist()}")
     
     # Energy/volume analysis over time
     print(f"\n📈 Energy/Volume Analysis:")
-    rms = librosa.feature.rms(y=y, hop_length=hop_length)[0]
-    rms_times = librosa.frames_to_time(np.arange(len(rms)), sr=sr, hop_length=hop_length)
+    rms = librosa.feature.rms(S=S, frame_length=n_fft, hop_length=hop_length)[0]
+    rms_times = frame_times
     
     # Normalize RMS
     rms_db = librosa.amplitude_to_db(rms, ref=np.max)
     
-    energy_contour = [{"time": float(t), "energy_db": float(e)} 
-                      for t, e in zip(rms_times, rms_db)]
-    
-    print(f"   Energy contour points: {len(energy_contour)}")
+    print(f"   Energy contour points: {len(rms_db)}")
     print(f"   Average energy: {np.mean(rms_db):.2f} dB")
     
     # Detect silence/gaps
@@ -185,23 +262,12 @@ def analyze_audio_detailed(audio_path):
     threshold = np.percentile(rms, 15)  # Bottom 15% is silence
     silence_mask = rms < threshold
     
-    gaps = []
-    in_gap = False
-    gap_start = 0
+    gap_start_times, gap_end_times = _find_gaps(silence_mask, rms_times, 0.15)  # Gaps longer than 0.15s
     
-    for i, is_silent in enumerate(silence_mask):
-        if is_silent and not in_gap:
-            gap_start = rms_times[i]
-            in_gap = True
-        elif not is_silent and in_gap:
-            gap_end = rms_times[i]
-            if gap_end - gap_start > 0.15:  # Gaps longer than 0.15s
-                gaps.append({
-                    "start": float(gap_start),
-                    "end": float(gap_end),
-                    "duration": float(gap_end - gap_start)
-                })
-            in_gap = False
+    gaps = [
+        {"start": float(start), "end": float(end), "duration": float(end - start)}
+        for start, end in zip(gap_start_times, gap_end_times)
+    ]
     
     print(f"   Silent gaps detected: {len(gaps)}")
     for i, gap in enumerate(gaps[:5]):
@@ -211,8 +277,8 @@ def analyze_audio_detailed(audio_path):
     
     # Spectral features
     print(f"\n🌈 Spectral Analysis:")
-    spectral_centroids = librosa.feature.spectral_centroid(y=y, sr=sr)[0]
-    spectral_rolloff = librosa.feature.spectral_rolloff(y=y, sr=sr)[0]
+    spectral_centroids = librosa.feature.spectral_centroid(S=S, sr=sr, n_fft=n_fft, hop_length=hop_length)[0]
+    spectral_rolloff = librosa.feature.spectral_rolloff(S=S, sr=sr, n_fft=n_fft, hop_length=hop_length)[0]
     
     print(f"   Average Spectral Centroid: {np.mean(spectral_centroids):.2f} Hz")
     print(f"   Average Spectral Rolloff: {np.mean(spectral_rolloff):.2f} Hz")
@@ -225,12 +291,11 @@ def analyze_audio_detailed(audio_path):
     return {
         "duration": float(duration),
         "sample_rate": int(sr),
+        "source_sample_rate": int(source_sr),
         "tempo": float(tempo),
-        "beat_times": beat_times.tolist(),
-        "onset_times": onset_times.tolist(),
+        "beat_times": beat_times,
+        "onset_times": onset_times,
         "num_syllables_estimate": len(onset_times),
-        "pitch_contour": pitch_contour,
-        "energy_contour": energy_contour,
         "gaps": gaps,
         "spectral_centroid_mean": float(np.mean(spectral_centroids)),
         "spectral_rolloff_mean": float(np.mean(spectral_rolloff)),
@@ -238,26 +303,45 @@ def analyze_audio_detailed(audio_path):
         "raw_audio_data": {
             "y_shape": len(y),
             "sample_rate": int(sr)
-        }
+        },
+        # In-memory arrays for later steps; main() pops these before the JSON report.
+        # The pitch and energy contours stay as parallel time/value arrays until then.
+        "pitch_times": pitch_times,
+        "pitch_hz": pitch_hz,
+        "y": y,
+        "S": S,
+        "rms": rms,
+        "rms_times": rms_times,
+        "rms_db": rms_db
     }
 
 
-def transcribe_with_word_timestamps(audio_path, client, onset_times=None):
+def request_transcription(audio_path, client):
     """
-    Transcribe audio using Whisper with precise word-level timestamps.
-    Cross-validates with onset detection if provided.
+    Call the Whisper API for word- and segment-level timestamps.
+    Network-bound, so main() runs it alongside the local audio analysis.
     """
-    print("\n" + "="*70)
-    print("TRANSCRIPTION WITH WORD TIMESTAMPS")
-    print("="*70)
-    
     with open(audio_path, "rb") as audio_file:
-        transcription = client.audio.transcriptions.create(
+        return client.audio.transcriptions.create(
             model="whisper-1",
             file=audio_file,
             response_format="verbose_json",
             timestamp_granularities=["word", "segment"]
         )
+
+
+def transcribe_with_word_timestamps(audio_path, client, onset_times=None, transcription=None):
+    """
+    Transcribe audio using Whisper with precise word-level timestamps.
+    Cross-validates with onset detection if provided.
+    Pass a finished `transcription` to skip the API request.
+    """
+    print("\n" + "="*70)
+    print("TRANSCRIPTION WITH WORD TIMESTAMPS")
+    print("="*70)
+    
+    if transcription is None:
+        transcription = request_transcription(audio_path, client)
     
     full_text = transcription.text
     print(f"\n📝 Full Transcription:")
@@ -270,6 +354,17 @@ def transcribe_with_word_timestamps(audio_path, client, onset_times=None):
         print(f"   {'#':<4} {'Word':<20} {'Start':<10} {'End':<10} {'Duration':<10} {'Offset':<10}")
         print(f"   {'-'*70}")
         
+        # Nearest onset to every word start: binary search into the sorted onsets,
+        # then keep the closer of the two neighbours (the earlier one on ties)
+        onset_offsets = None
+        if onset_times is not None and len(onset_times) > 0:
+            onset_arr = np.sort(np.asarray(onset_times, dtype=np.float64))
+            word_starts = np.array([w.start for w in transcription.words], dtype=np.float64)
+            idx = np.clip(np.searchsorted(onset_arr, word_starts), 1, len(onset_arr) - 1)
+            left, right = onset_arr[idx - 1], onset_arr[idx]
+            nearest = np.where(word_starts - left <= right - word_starts, left, right)
+            onset_offsets = word_starts - nearest
+        
         for i, word in enumerate(transcription.words):
             duration = word.end - word.start
             
@@ -282,9 +377,8 @@ def transcribe_with_word_timestamps(audio_path, client, onset_times=None):
             }
             
             # Cross-validate with onset detection
-            if onset_times is not None and len(onset_times) > 0:
-                nearest_onset = min(onset_times, key=lambda o: abs(o - word.start))
-                onset_offset = word.start - nearest_onset
+            if onset_offsets is not None:
+                onset_offset = onset_offsets[i]
                 word_data["onset_offset"] = float(onset_offset)
                 
                 print(f"   {i+1:<4} {word.word:<20} {word.start:<10.3f} {word.end:<10.3f} {duration:<10.3f} {onset_offset:+.3f}")
@@ -316,7 +410,14 @@ def transcribe_with_word_timestamps(audio_path, client, onset_times=None):
     }
 
 
-def enrich_word_timings_with_features(word_timings, audio_path, pitch_contour, energy_contour, rms_times, rms_db):
+def contour_records(times, values, key):
+    """
+    Expand parallel time/value arrays into the report's [{"time", key}, ...] form.
+    """
+    return [{"time": t, key: v} for t, v in zip(times.tolist(), values.tolist())]
+
+
+def enrich_word_timings_with_features(word_timings, pitch_times, pitch_hz, rms_times, rms_db):
     """
     Add per-word pitch and energy features for synthesis control.
     """
@@ -324,30 +425,41 @@ def enrich_word_timings_with_features(word_timings, audio_path, pitch_contour, e
     print("ENRICHING WORD TIMINGS WITH AUDIO FEATURES")
     print("="*70)
     
-    for word in word_timings:
-        start = word['start']
-        end = word['end']
-        
+    # Both time axes are sorted: resolve every word's inclusive [start, end]
+    # window with one binary search per boundary instead of a mask per word
+    word_starts = np.array([w['start'] for w in word_timings])
+    word_ends = np.array([w['end'] for w in word_timings])
+    
+    energy_lo = np.searchsorted(rms_times, word_starts, side='left')
+    energy_hi = np.searchsorted(rms_times, word_ends, side='right')
+    pitch_lo = np.searchsorted(pitch_times, word_starts, side='left')
+    pitch_hi = np.searchsorted(pitch_times, word_ends, side='right')
+    
+    # Average pitch of every word via prefix sums, converted to notes in one batch
+    pitch_counts = pitch_hi - pitch_lo
+    pitch_csum = np.concatenate(([0.0], np.cumsum(pitch_hz, dtype=np.float64)))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        word_avg_pitch = (pitch_csum[pitch_hi] - pitch_csum[pitch_lo]) / pitch_counts
+    word_midi, word_note_valid = hz_to_midi_notes(word_avg_pitch)
+    
+    for i, word in enumerate(word_timings):
         # Calculate average energy for this word
-        energy_mask = (rms_times >= start) & (rms_times <= end)
-        if np.any(energy_mask):
-            word['avg_energy_db'] = float(np.mean(rms_db[energy_mask]))
-            word['max_energy_db'] = float(np.max(rms_db[energy_mask]))
+        word_energy = rms_db[energy_lo[i]:energy_hi[i]]
+        if word_energy.size:
+            word['avg_energy_db'] = float(word_energy.mean())
+            word['max_energy_db'] = float(word_energy.max())
         else:
             word['avg_energy_db'] = None
             word['max_energy_db'] = None
         
         # Calculate average pitch for this word
-        word_pitches = [p['pitch_hz'] for p in pitch_contour if start <= p['time'] <= end]
-        if word_pitches:
-            word['avg_pitch_hz'] = float(np.mean(word_pitches))
-            word['min_pitch_hz'] = float(np.min(word_pitches))
-            word['max_pitch_hz'] = float(np.max(word_pitches))
+        word_pitches = pitch_hz[pitch_lo[i]:pitch_hi[i]]
+        if word_pitches.size:
+            word['avg_pitch_hz'] = float(word_avg_pitch[i])
+            word['min_pitch_hz'] = float(word_pitches.min())
+            word['max_pitch_hz'] = float(word_pitches.max())
             word['pitch_range_hz'] = word['max_pitch_hz'] - word['min_pitch_hz']
-            
-            # Convert to notes
-            avg_note = hz_to_note(word['avg_pitch_hz'])
-            word['avg_note'] = avg_note
+            word['avg_note'] = str(NOTE_NAMES[word_midi[i]]) if word_note_valid[i] else None
         else:
             word['avg_pitch_hz'] = None
             word['min_pitch_hz'] = None
@@ -365,6 +477,11 @@ def enrich_word_timings_with_features(word_timings, audio_path, pitch_contour, e
     return word_timings
 
 
+def _write_wav(path, samples, sr, subtype):
+    """Write one word clip to disk."""
+    sf.write(path, samples, sr, subtype=subtype)
+
+
 def create_word_segments(audio_path, word_timings, output_dir):
     """
     Split audio into individual word segments for precise translation.
@@ -375,27 +492,24 @@ def create_word_segments(audio_path, word_timings, output_dir):
     
     os.makedirs(output_dir, exist_ok=True)
     
-    audio = AudioSegment.from_wav(audio_path)
+    # Load once and slice sample ranges instead of re-exporting through pydub
+    data, sr = sf.read(audio_path, dtype='float32')
+    subtype = sf.info(audio_path).subtype
+    padding = int(0.05 * sr)  # 50ms before and after
     word_files = []
+    writes = []
     
     for i, word_info in enumerate(word_timings):
         word = word_info['word']
-        start_ms = int(word_info['start'] * 1000)
-        end_ms = int(word_info['end'] * 1000)
-        
-        # Add small padding (50ms before and after)
-        padding = 50
-        start_ms = max(0, start_ms - padding)
-        end_ms = min(len(audio), end_ms + padding)
-        
-        word_segment = audio[start_ms:end_ms]
+        start = max(0, int(word_info['start'] * sr) - padding)
+        end = min(len(data), int(word_info['end'] * sr) + padding)
         
         # Clean filename
         safe_word = word.replace('/', '_').replace('\\', '_').replace(' ', '_')
         filename = f"word_{i:03d}_{safe_word}.wav"
         filepath = os.path.join(output_dir, filename)
         
-        word_segment.export(filepath, format="wav")
+        writes.append((filepath, data[start:end], sr, subtype))
         
         word_file_info = {
             "index": i,
@@ -415,17 +529,23 @@ def create_word_segments(audio_path, word_timings, output_dir):
             word_file_info['avg_energy_db'] = word_info['avg_energy_db']
         
         word_files.append(word_file_info)
-        
-        print(f"   ✓ Word {i+1}: '{word}' -> {filename}")
+    
+    # libsndfile releases the GIL, so a thread pool writes the clips in parallel
+    with ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1)) as pool:
+        list(pool.map(lambda args: _write_wav(*args), writes))
+    
+    for info in word_files:
+        print(f"   ✓ Word {info['index']+1}: '{info['word']}' -> {info['file']}")
     
     print(f"\n✓ Created {len(word_files)} word segments in: {output_dir}")
     
     return word_files
 
 
-def create_visual_diagnostics(audio_path, onset_times, beat_times, word_timings, output_dir):
+def create_visual_diagnostics(y, sr, S_db, rms, rms_times, onset_times, beat_times, word_timings, output_dir):
     """
     Generate visual diagnostic plots for analysis.
+    Reuses the signal, dB spectrogram and RMS from analyze_audio_detailed.
     """
     print("\n" + "="*70)
     print("GENERATING VISUAL DIAGNOSTICS")
@@ -433,11 +553,13 @@ def create_visual_diagnostics(audio_path, onset_times, beat_times, word_timings,
     
     os.makedirs(output_dir, exist_ok=True)
     
-    y, sr = librosa.load(audio_path, sr=None)
+    dpi = 96
     
     # Plot 1: Waveform with onsets
     plt.figure(figsize=(14, 6))
-    librosa.display.waveshow(y, sr=sr, alpha=0.6, color='blue')
+    # Envelope of ~2 points per output pixel instead of every sample
+    max_points = int(14 * dpi * 2)
+    librosa.display.waveshow(y, sr=sr, max_points=max_points, alpha=0.6, color='blue')
     plt.title("Waveform with Onset Detection", fontsize=14, fontweight='bold')
     
     for onset in onset_times:
@@ -447,14 +569,13 @@ def create_visual_diagnostics(audio_path, onset_times, beat_times, word_timings,
     plt.ylabel("Amplitude")
     plt.tight_layout()
     waveform_path = os.path.join(output_dir, "01_waveform_onsets.png")
-    plt.savefig(waveform_path, dpi=150)
+    plt.savefig(waveform_path, dpi=dpi)
     plt.close()
     print(f"   ✓ Saved: {waveform_path}")
     
     # Plot 2: Spectrogram with word boundaries
     plt.figure(figsize=(14, 8))
-    D = librosa.amplitude_to_db(np.abs(librosa.stft(y)), ref=np.max)
-    librosa.display.specshow(D, sr=sr, x_axis='time', y_axis='hz')
+    librosa.display.specshow(S_db, sr=sr, x_axis='time', y_axis='hz', rasterized=True)
     plt.colorbar(format='%+2.0f dB')
     plt.title("Spectrogram with Word Boundaries", fontsize=14, fontweight='bold')
     
@@ -467,22 +588,20 @@ def create_visual_diagnostics(audio_path, onset_times, beat_times, word_timings,
     plt.ylim(0, 4000)
     plt.tight_layout()
     spectrogram_path = os.path.join(output_dir, "02_spectrogram_words.png")
-    plt.savefig(spectrogram_path, dpi=150)
+    plt.savefig(spectrogram_path, dpi=dpi)
     plt.close()
     print(f"   ✓ Saved: {spectrogram_path}")
     
     # Plot 3: Energy contour
     plt.figure(figsize=(14, 5))
-    rms = librosa.feature.rms(y=y, hop_length=512)[0]
-    times = librosa.frames_to_time(np.arange(len(rms)), sr=sr, hop_length=512)
-    plt.plot(times, rms, color='purple', linewidth=1.5)
+    plt.plot(rms_times, rms, color='purple', linewidth=1.5)
     plt.title("Energy (RMS) Over Time", fontsize=14, fontweight='bold')
     plt.xlabel("Time (s)")
     plt.ylabel("RMS Energy")
     plt.grid(alpha=0.3)
     plt.tight_layout()
     energy_path = os.path.join(output_dir, "03_energy_contour.png")
-    plt.savefig(energy_path, dpi=150)
+    plt.savefig(energy_path, dpi=dpi)
     plt.close()
     print(f"   ✓ Saved: {energy_path}")
     
@@ -545,6 +664,8 @@ def create_markdown_report(output_path, analysis_data, visual_paths):
                 rel_path = Path(path).name
                 f.write(f"### {title.replace('_', ' ').title()}\n\n")
                 f.write(f"![{title}]({rel_path})\n\n")
+        else:
+            f.write("*Visual diagnostics were skipped for this run.*\n\n")
         
         f.write("---\n\n")
         f.write("## 🔇 Detected Silence Gaps\n\n")
@@ -566,13 +687,23 @@ def save_analysis_report(output_path, analysis_data):
     """
     Save comprehensive analysis report as JSON.
     """
-    with open(output_path, 'w', encoding='utf-8') as f:
-        json.dump(analysis_data, f, indent=2, ensure_ascii=False)
+    # orjson writes numpy arrays and scalars directly, so the contours need no float() conversion
+    with open(output_path, 'wb') as f:
+        f.write(orjson.dumps(analysis_data, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY))
     
     print(f"\n✓ Analysis report saved: {output_path}")
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Precise vocal analysis with word-level timing, pitch and energy.")
+    parser.add_argument(
+        "--no-plots",
+        action="store_true",
+        default=os.getenv("NO_PLOTS", "").lower() in ("1", "true", "yes"),
+        help="Skip the matplotlib diagnostics (also enabled by NO_PLOTS=1)"
+    )
+    args = parser.parse_args()
+    
     workspace_root = Path(__file__).parent
     
     # Create timestamped run folder for data lineage
@@ -612,18 +743,33 @@ def main():
     print("STEP 2: ANALYZING AUDIO CHARACTERISTICS")
     print("="*70)
     
-    audio_analysis = analyze_audio_detailed(str(segment_output))
+    # Whisper needs only the segment file, so its API round-trip overlaps the analysis
+    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        transcription_future = executor.submit(request_transcription, str(segment_output), client)
+        audio_analysis = analyze_audio_detailed(str(segment_output))
+        transcription = transcription_future.result()
+    
+    # Keep the contour, signal, spectrogram and RMS arrays out of the JSON report
+    pitch_times = audio_analysis.pop('pitch_times')
+    pitch_hz = audio_analysis.pop('pitch_hz')
+    y = audio_analysis.pop('y')
+    S = audio_analysis.pop('S')
+    rms = audio_analysis.pop('rms')
+    rms_times = audio_analysis.pop('rms_times')
+    rms_db = audio_analysis.pop('rms_db')
     
     # Step 3: Transcribe with word timestamps
     print("\n" + "="*70)
     print("STEP 3: TRANSCRIBING WITH WORD TIMESTAMPS")
     print("="*70)
     
-    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    # Onset cross-validation runs here, once both the analysis and transcript are in
     transcription_data = transcribe_with_word_timestamps(
         str(segment_output), 
         client,
-        onset_times=audio_analysis['onset_times']
+        onset_times=audio_analysis['onset_times'],
+        transcription=transcription
     )
     
     # Step 4: Enrich word timings with audio features
@@ -631,18 +777,10 @@ def main():
     print("STEP 4: ENRICHING WORD DATA WITH PITCH & ENERGY")
     print("="*70)
     
-    # Load RMS data for enrichment
-    y, sr = librosa.load(str(segment_output), sr=None)
-    hop_length = 512
-    rms = librosa.feature.rms(y=y, hop_length=hop_length)[0]
-    rms_times = librosa.frames_to_time(np.arange(len(rms)), sr=sr, hop_length=hop_length)
-    rms_db = librosa.amplitude_to_db(rms, ref=np.max)
-    
     enriched_word_timings = enrich_word_timings_with_features(
         transcription_data['word_timings'],
-        str(segment_output),
-        audio_analysis['pitch_contour'],
-        audio_analysis['energy_contour'],
+        pitch_times,
+        pitch_hz,
         rms_times,
         rms_db
     )
@@ -667,19 +805,31 @@ def main():
     print("="*70)
     
     visual_dir = run_folder / "visualizations"
-    visual_paths = create_visual_diagnostics(
-        str(segment_output),
-        audio_analysis['onset_times'],
-        audio_analysis['beat_times'],
-        enriched_word_timings,
-        str(visual_dir)
-    )
+    if args.no_plots:
+        print("\n⏭️  Skipped (--no-plots)")
+        visual_paths = {}
+    else:
+        visual_paths = create_visual_diagnostics(
+            y,
+            audio_analysis['raw_audio_data']['sample_rate'],
+            librosa.amplitude_to_db(S, ref=np.max),
+            rms,
+            rms_times,
+            audio_analysis['onset_times'],
+            audio_analysis['beat_times'],
+            enriched_word_timings,
+            str(visual_dir)
+        )
     
     # Step 7: Compile complete analysis report
     print("\n" + "="*70)
     print("STEP 7: GENERATING ANALYSIS REPORTS")
     print("="*70)
     
+    # Contours are only expanded into per-frame records for the report
+    audio_analysis['pitch_contour'] = contour_records(pitch_times, pitch_hz, "pitch_hz")
+    audio_analysis['energy_contour'] = contour_records(rms_times, rms_db, "energy_db")
+    
     complete_analysis = {
         "run_id": timestamp,
         "source_file": str(vocals_file),
@@ -734,8 +884,9 @@ def main():
     print(f"\n📄 Reports:")
     print(f"   JSON: {report_json_path.name}")
     print(f"   Markdown: {report_md_path.name}")
-    print(f"\n📊 Visualizations:")
-    print(f"   {visual_dir}")
+    if visual_paths:
+        print(f"\n📊 Visualizations:")
+        print(f"   {visual_dir}")
     print(f"\n✓ Ready for translation! Each word is isolated with precise timing, pitch, and energy data.")
     print("="*70)
 
@@ -0,0 +1,51 @@
+import numpy as np
+import soundfile as sf
+import soxr
+
+
+def load_wav(path):
+    """
+    Read a WAV file as float32 samples shaped (frames, channels) and its sample rate.
+    """
+    data, sr = sf.read(str(path), dtype='float32', always_2d=True)
+    return data, sr
+
+
+def save_wav(path, data, sr):
+    """
+    Write float samples as 16-bit PCM, clipping anything outside [-1, 1].
+    """
+    sf.write(str(path), np.clip(data, -1.0, 1.0), sr, subtype='PCM_16')
+
+
+def match_format(data, sr, target_sr, channels):
+    """
+    Resample and up/down-mix samples so they can be mixed into a target track.
+    """
+    if sr != target_sr:
+        data = soxr.resample(data, sr, target_sr)
+    
+    if data.shape[1] != channels:
+        # Mono is duplicated across channels; anything else is folded to mono first
+        if data.shape[1] > 1:
+            data = data.mean(axis=1, keepdims=True)
+        data = np.repeat(data, channels, axis=1)
+    
+    return data
+
+
+def mix_at(base, clip, offset, gain_db=0.0):
+    """
+    Add clip into base starting at sample offset, with an optional dB gain.
+    Samples running past the end of base are dropped.
+    """
+    end = min(len(base), offset + len(clip))
+    if end <= offset:
+        return base
+    
+    if gain_db:
+        base[offset:end] += clip[:end - offset] * (10 ** (gain_db / 20))
+    else:
+        base[offset:end] += clip[:end - offset]
+    
+    return base
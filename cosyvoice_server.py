@@ -0,0 +1,195 @@
+import os
+import sys
+import secrets
+import functools
+import threading
+import numpy as np
+import torch
+import torchaudio
+from pathlib import Path
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Listener, Client
+
+# --- Path Setup ---
+repo_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "external", "CosyVoice"))
+if repo_root not in sys.path:
+    sys.path.insert(0, repo_root)
+
+matcha_path = os.path.join(repo_root, "third_party", "Matcha-TTS")
+if matcha_path not in sys.path:
+    sys.path.insert(0, matcha_path)
+
+# --- Config ---
+MODEL_NAME = "iic/CosyVoice-300M"
+SERVER_ADDRESS = ("localhost", int(os.environ.get("COSYVOICE_SERVER_PORT", 6190)))
+# Connections carry pickles, so the key must be secret: COSYVOICE_SERVER_AUTHKEY,
+# or a per-user key file the server creates (mode 0600) on first start
+AUTHKEY_FILE = Path(os.getenv("COSYVOICE_SERVER_KEYFILE", Path.home() / ".cosyvoice_server_key"))
+# Set TORCH_COMPILE=1 to compile the decode paths (slow first lines, faster after)
+TORCH_COMPILE = os.getenv("TORCH_COMPILE", "0") == "1"
+
+
+@functools.lru_cache(maxsize=8)
+def get_resampler(orig_sr):
+    """
+    Resample transform to 16kHz (CosyVoice's prompt rate), built once per source rate.
+    Constructing Resample computes its sinc kernel, so prompts sharing a rate reuse it.
+    """
+    return torchaudio.transforms.Resample(orig_freq=orig_sr, new_freq=16000)
+
+
+def compile_model(cosyvoice):
+    """
+    Wrap the LLM decode step and the flow / HiFT inference calls with torch.compile
+    when TORCH_COMPILE=1. Anything the loaded model doesn't have is left alone.
+    """
+    if not TORCH_COMPILE:
+        return cosyvoice
+    
+    model = cosyvoice.model
+    # llm.inference is a token generator, so compile its per-step decoder instead
+    decoder = getattr(getattr(model, "llm", None), "llm", None)
+    if hasattr(decoder, "forward_one_step"):
+        decoder.forward_one_step = torch.compile(decoder.forward_one_step, mode="reduce-overhead", fullgraph=False)
+    for name in ("flow", "hift"):
+        module = getattr(model, name, None)
+        if hasattr(module, "inference"):
+            module.inference = torch.compile(module.inference, mode="reduce-overhead", fullgraph=False)
+    
+    print("⚙️  torch.compile enabled (the first lines are slow while graphs are built)")
+    return cosyvoice
+
+
+def load_authkey(create=False):
+    """
+    Return the server auth key: COSYVOICE_SERVER_AUTHKEY if set, otherwise the
+    contents of AUTHKEY_FILE. With create=True (the server) a missing file is
+    created with a random key; clients get None when there is no key yet.
+    """
+    env_key = os.getenv("COSYVOICE_SERVER_AUTHKEY")
+    if env_key:
+        return env_key.encode()
+    
+    if not AUTHKEY_FILE.exists():
+        if not create:
+            return None
+        try:
+            # O_EXCL + 0600: only this user can read the key, and two servers can't race on it
+            fd = os.open(AUTHKEY_FILE, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            with os.fdopen(fd, 'wb') as f:
+                f.write(secrets.token_hex(32).encode())
+        except FileExistsError:
+            pass
+    
+    if os.name == "posix" and AUTHKEY_FILE.stat().st_mode & 0o077:
+        raise PermissionError(f"{AUTHKEY_FILE} is readable by other users; run: chmod 600 {AUTHKEY_FILE}")
+    return AUTHKEY_FILE.read_bytes().strip()
+
+
+def handle_connection(conn, cosyvoice, model_lock):
+    """
+    Answer requests on one client connection until it closes.
+    Requests are dicts: {'op': 'info'} or {'op': 'tts', 'text': str, 'prompt': float32 array}.
+    """
+    try:
+        while True:
+            try:
+                request = conn.recv()
+            except EOFError:
+                break
+            
+            if request.get('op') == 'info':
+                conn.send({'sample_rate': cosyvoice.sample_rate})
+                continue
+            
+            try:
+                prompt_speech_16k = torch.from_numpy(request['prompt'])
+                audio_chunks = []
+                # One CosyVoice instance shares its frontend/LLM state, so requests take turns
+                with model_lock, torch.inference_mode():
+                    for model_output in cosyvoice.inference_cross_lingual(
+                        tts_text=request['text'],
+                        prompt_speech_16k=prompt_speech_16k,
+                        stream=False,
+                        speed=request.get('speed', 1.0)
+                    ):
+                        audio_chunks.append(model_output['tts_speech'].cpu().numpy())
+                audio = np.concatenate(audio_chunks, axis=1) if audio_chunks else None
+                conn.send({'audio': audio})
+            except Exception as e:
+                conn.send({'error': str(e)})
+    finally:
+        conn.close()
+
+
+def serve():
+    """
+    Load CosyVoice once and answer TTS requests from the generation scripts.
+    Each client connection is handled on its own thread; the model itself is
+    used by one request at a time.
+    """
+    from cosyvoice.cli.cosyvoice import CosyVoice
+    
+    authkey = load_authkey(create=True)
+    
+    print("🎶 Loading CosyVoice model... please wait.")
+    # On GPU, run the LLM and flow-matching models in FP16 (HiFT stays FP32)
+    use_fp16 = torch.cuda.is_available()
+    cosyvoice = compile_model(CosyVoice(MODEL_NAME, fp16=use_fp16))
+    print(f"✅ Model loaded successfully! ({'cuda fp16' if use_fp16 else 'cpu fp32'})")
+    
+    model_lock = threading.Lock()
+    with Listener(SERVER_ADDRESS, authkey=authkey) as listener:
+        print(f"🟢 Serving on {SERVER_ADDRESS[0]}:{SERVER_ADDRESS[1]} (Ctrl+C to stop)")
+        while True:
+            try:
+                conn = listener.accept()
+            except (AuthenticationError, OSError) as e:
+                print(f"⚠️  Rejected connection: {e}")
+                continue
+            threading.Thread(target=handle_connection, args=(conn, cosyvoice, model_lock), daemon=True).start()
+
+
+class RemoteCosyVoice:
+    """
+    Client for a running cosyvoice_server.py with the same
+    sample_rate / inference_cross_lingual() interface as CosyVoice.
+    """
+    def __init__(self, authkey):
+        self.authkey = authkey
+        with Client(SERVER_ADDRESS, authkey=authkey) as conn:
+            conn.send({'op': 'info'})
+            self.sample_rate = conn.recv()['sample_rate']
+    
+    def inference_cross_lingual(self, tts_text, prompt_speech_16k, stream=False, speed=1.0):
+        with Client(SERVER_ADDRESS, authkey=self.authkey) as conn:
+            conn.send({'op': 'tts', 'text': tts_text, 'prompt': prompt_speech_16k.cpu().numpy(), 'speed': speed})
+            reply = conn.recv()
+        if 'error' in reply:
+            raise RuntimeError(reply['error'])
+        if reply['audio'] is not None:
+            yield {'tts_speech': torch.from_numpy(reply['audio'])}
+
+
+def load_cosyvoice(model_name=MODEL_NAME):
+    """
+    Reuse the warm model of a running server if there is one, or load it here.
+    """
+    try:
+        authkey = load_authkey()
+        if authkey:
+            cosyvoice = RemoteCosyVoice(authkey)
+            print(f"✅ Using CosyVoice server at {SERVER_ADDRESS[0]}:{SERVER_ADDRESS[1]}")
+            return cosyvoice
+    except (ConnectionRefusedError, AuthenticationError, OSError) as e:
+        # No server, or one started with a different key: load the model here
+        if not isinstance(e, ConnectionRefusedError):
+            print(f"⚠️  Not using the CosyVoice server: {e}")
+    
+    from cosyvoice.cli.cosyvoice import CosyVoice
+    # On GPU, run the LLM and flow-matching models in FP16 (HiFT stays FP32)
+    return compile_model(CosyVoice(model_name, fp16=torch.cuda.is_available()))
+
+
+if __name__ == "__main__":
+    serve()
@@ -1,10 +1,14 @@
 import os
+import re
 import sys
-import json
+import orjson
+import numpy as np
+from numba import njit
 import torch
 import torchaudio
 from pathlib import Path
-from pydub import AudioSegment
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 # --- Path Setup ---
 repo_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "external", "CosyVoice"))
@@ -16,6 +20,19 @@ if matcha_path not in sys.path:
     sys.path.insert(0, matcha_path)
 
 from cosyvoice.cli.cosyvoice import CosyVoice
+from cosyvoice_server import compile_model, get_resampler
+
+# Inference only: no autograd bookkeeping, and let cuDNN autotune the repeated shapes
+torch.set_grad_enabled(False)
+torch.backends.cudnn.benchmark = True
+
+workspace_root = Path(__file__).parent
+
+# Time-range key in a segment file name, e.g. "6-23s" in segment_6-23s_trimmed.wav
+PART_RE = re.compile(r'(\d+-\d+s)')
+
+# Segments whose inputs are loaded ahead while the current one is on the GPU
+PREFETCH_DEPTH = 2
 
 # Spanish translations for all segments
 SPANISH_LYRICS = {
@@ -104,40 +121,95 @@ ITALIAN_LYRICS = {
     ]
 }
 
-def create_line_chunks_from_json(segment_audio_path, analysis_data, target_lines, output_dir, language="spanish"):
+@njit(cache=True)
+def summarize_lines(starts, ends, pitches, energies, n_lines):
+    """
+    Divide the words evenly into n_lines (earlier lines take the remainder) and
+    average each line's pitch and energy, skipping NaN entries.
+    Returns (first_word, last_word, start_time, end_time, avg_pitch, avg_energy)
+    arrays for the lines that received at least one word.
+    """
+    n_words = starts.shape[0]
+    words_per_line = n_words // n_lines
+    remainder = n_words % n_lines
+    
+    line_starts = np.empty(n_lines, dtype=np.int64)
+    line_ends = np.empty(n_lines, dtype=np.int64)
+    t_starts = np.empty(n_lines)
+    t_ends = np.empty(n_lines)
+    avg_pitch = np.empty(n_lines)
+    avg_energy = np.empty(n_lines)
+    
+    n = 0
+    current_idx = 0
+    for line_num in range(n_lines):
+        if current_idx >= n_words:
+            break
+        line_size = words_per_line + (1 if line_num < remainder else 0)
+        end_idx = min(current_idx + line_size - 1, n_words - 1)
+        
+        pitch_sum = 0.0
+        pitch_count = 0
+        energy_sum = 0.0
+        energy_count = 0
+        for i in range(current_idx, end_idx + 1):
+            if not np.isnan(pitches[i]):
+                pitch_sum += pitches[i]
+                pitch_count += 1
+            if not np.isnan(energies[i]):
+                energy_sum += energies[i]
+                energy_count += 1
+        
+        line_starts[n] = current_idx
+        line_ends[n] = end_idx
+        t_starts[n] = starts[current_idx]
+        t_ends[n] = ends[end_idx]
+        avg_pitch[n] = pitch_sum / pitch_count if pitch_count else np.nan
+        avg_energy[n] = energy_sum / energy_count if energy_count else np.nan
+        n += 1
+        current_idx = end_idx + 1
+    
+    return line_starts[:n], line_ends[:n], t_starts[:n], t_ends[:n], avg_pitch[:n], avg_energy[:n]
+
+def word_arrays(word_timings):
+    """
+    Turn the analysis word list (one dict per word) into flat per-field arrays.
+    Missing or zero pitch/energy values become NaN.
+    """
+    n_words = len(word_timings)
+    return {
+        'start': np.fromiter((w['time_relative']['start'] for w in word_timings), dtype=np.float64, count=n_words),
+        'end': np.fromiter((w['time_relative']['end'] for w in word_timings), dtype=np.float64, count=n_words),
+        'pitch': np.fromiter((w.get('avg_pitch_hz') or np.nan for w in word_timings), dtype=np.float64, count=n_words),
+        'energy': np.fromiter((w.get('avg_energy_db') or np.nan for w in word_timings), dtype=np.float64, count=n_words),
+        'text': [w['word'] for w in word_timings]
+    }
+
+def create_line_chunks_from_json(prompt_16k, words, target_lines, language="spanish"):
     """
     Create exactly 4 line chunks using JSON word timing data.
     Ensures proper timing, pitch, and tone preservation.
+    Each chunk's prompt is a slice of the segment's 16kHz mono reference;
+    `words` is the word_arrays() form of the analysis word timings.
     """
     print("\n" + "="*70)
     print(f"CREATING 4 LINE CHUNKS FROM JSON ANALYSIS ({language.upper()})")
     print("="*70)
     
-    audio = AudioSegment.from_wav(segment_audio_path)
-    word_timings = analysis_data['transcription']['word_timings_dual_frame']
+    audio_length_ms = prompt_16k.shape[1] * 1000 / 16000
+    n_words = len(words['text'])
     
-    if len(word_timings) == 0:
+    if n_words == 0:
         print("❌ No word timings found in analysis")
         return []
     
-    # Calculate words per line (divide evenly into 4 lines)
-    total_words = len(word_timings)
-    words_per_line = total_words // 4
-    remainder = total_words % 4
-    
-    print(f"Total words: {total_words}")
-    print(f"Dividing into 4 lines (~{words_per_line} words each)")
-    
-    # Distribute words across 4 lines
-    line_word_ranges = []
-    current_idx = 0
+    # Split into 4 lines and average each line's pitch/energy in one compiled pass
+    line_starts, line_ends, t_starts, t_ends, line_pitch, line_energy = summarize_lines(
+        words['start'], words['end'], words['pitch'], words['energy'], 4
+    )
     
-    for line_num in range(4):
-        # Give extra words to first lines if there's a remainder
-        line_size = words_per_line + (1 if line_num < remainder else 0)
-        end_idx = min(current_idx + line_size - 1, total_words - 1)
-        line_word_ranges.append((current_idx, end_idx))
-        current_idx = end_idx + 1
+    print(f"Total words: {n_words}")
+    print(f"Dividing into 4 lines (~{n_words // 4} words each)")
     
     # Ensure we have exactly 4 target lines
     if len(target_lines) != 4:
@@ -148,15 +220,14 @@ def create_line_chunks_from_json(segment_audio_path, analysis_data, target_lines
         target_lines = target_lines[:4]
     
     chunks = []
-    os.makedirs(output_dir, exist_ok=True)
     
-    for line_idx, (start_word_idx, end_word_idx) in enumerate(line_word_ranges):
-        if start_word_idx >= len(word_timings):
-            break
-            
+    for line_idx in range(len(line_starts)):
+        start_word_idx = int(line_starts[line_idx])
+        end_word_idx = int(line_ends[line_idx])
+        
         # Get exact time range from JSON
-        start_time_relative = word_timings[start_word_idx]['time_relative']['start']
-        end_time_relative = word_timings[end_word_idx]['time_relative']['end']
+        start_time_relative = float(t_starts[line_idx])
+        end_time_relative = float(t_ends[line_idx])
         
         start_time_ms = start_time_relative * 1000
         end_time_ms = end_time_relative * 1000
@@ -164,36 +235,19 @@ def create_line_chunks_from_json(segment_audio_path, analysis_data, target_lines
         # Extract chunk with minimal padding to preserve timing
         padding_ms = 50  # Reduced padding for better sync
         chunk_start = max(0, start_time_ms - padding_ms)
-        chunk_end = min(len(audio), end_time_ms + padding_ms)
-        
-        chunk_audio = audio[chunk_start:chunk_end]
+        chunk_end = min(audio_length_ms, end_time_ms + padding_ms)
         
-        # Save chunk
-        chunk_path = os.path.join(output_dir, f"chunk_line_{line_idx + 1}.wav")
-        chunk_audio.export(chunk_path, format="wav")
+        # Slice the already resampled reference (16 samples per ms)
+        chunk_prompt = prompt_16k[:, int(chunk_start * 16):int(chunk_end * 16)]
         
         duration = (chunk_end - chunk_start) / 1000.0
         
         # Get Portuguese text and audio features
-        portuguese_words = [word_timings[i]['word'] for i in range(start_word_idx, end_word_idx + 1)]
-        portuguese_text = ' '.join(portuguese_words)
-        
-        # Extract average pitch and energy for this line
-        avg_pitch = None
-        avg_energy = None
-        pitch_values = []
-        energy_values = []
+        portuguese_text = ' '.join(words['text'][start_word_idx:end_word_idx + 1])
         
-        for i in range(start_word_idx, end_word_idx + 1):
-            if 'avg_pitch_hz' in word_timings[i] and word_timings[i]['avg_pitch_hz']:
-                pitch_values.append(word_timings[i]['avg_pitch_hz'])
-            if 'avg_energy_db' in word_timings[i] and word_timings[i]['avg_energy_db']:
-                energy_values.append(word_timings[i]['avg_energy_db'])
-        
-        if pitch_values:
-            avg_pitch = sum(pitch_values) / len(pitch_values)
-        if energy_values:
-            avg_energy = sum(energy_values) / len(energy_values)
+        # Average pitch and energy for this line (NaN when no word has a value)
+        avg_pitch = None if np.isnan(line_pitch[line_idx]) else float(line_pitch[line_idx])
+        avg_energy = None if np.isnan(line_energy[line_idx]) else float(line_energy[line_idx])
         
         print(f"\n✓ Line {line_idx + 1}: {duration:.2f}s ({start_time_relative:.2f}s - {end_time_relative:.2f}s)")
         print(f"   Words: {start_word_idx}-{end_word_idx} ({end_word_idx - start_word_idx + 1} words)")
@@ -206,7 +260,7 @@ def create_line_chunks_from_json(segment_audio_path, analysis_data, target_lines
         
         chunks.append({
             'line_number': line_idx + 1,
-            'chunk_path': chunk_path,
+            'prompt_16k': chunk_prompt,
             'target_text': target_lines[line_idx],
             'duration': duration,
             'time_range': (start_time_relative, end_time_relative),
@@ -219,56 +273,75 @@ def create_line_chunks_from_json(segment_audio_path, analysis_data, target_lines
     
     return chunks
 
-def generate_target_chunk(cosyvoice, chunk_info, output_path, language="spanish"):
+def load_prompt_speech(ref_waveform, sr):
     """
-    Generate target language vocals for a single chunk with exact timing and tone preservation.
-    Uses reference audio pitch and energy for better matching.
+    Turn a segment's reference audio into the mono 16kHz prompt CosyVoice expects.
+    Done once per segment; the line chunks slice the result.
     """
-    print(f"\n🎤 Generating {language.capitalize()} for Line {chunk_info['line_number']}...")
-    print(f"   Text: {chunk_info['target_text']}")
-    print(f"   Duration: {chunk_info['duration']:.2f}s")
-    if chunk_info.get('avg_pitch_hz'):
-        print(f"   Target Pitch: {chunk_info['avg_pitch_hz']:.1f} Hz")
-    
-    # Load reference audio
-    ref_waveform, sr = torchaudio.load(chunk_info['chunk_path'])
-    
     # Convert stereo to mono
     if ref_waveform.shape[0] > 1:
         ref_waveform = torch.mean(ref_waveform, dim=0, keepdim=True)
     
     # Resample to 16kHz (required by CosyVoice)
     if sr != 16000:
-        resampler = torchaudio.transforms.Resample(orig_freq=sr, new_freq=16000)
-        prompt_speech_16k = resampler(ref_waveform)
+        prompt_speech_16k = get_resampler(sr)(ref_waveform)
     else:
         prompt_speech_16k = ref_waveform
     
-    print(f"   Reference duration: {prompt_speech_16k.shape[1]/16000:.2f}s @ 16kHz")
-    
-    # Generate target language vocals with same characteristics
+    return prompt_speech_16k
+
+def synthesize_line(cosyvoice, text, prompt_speech_16k):
+    """
+    Run one cross-lingual inference and return the concatenated speech tensor.
+    """
     audio_chunks = []
-    try:
+    with torch.inference_mode():
         # Use speed=1.0 to maintain timing sync
         for model_output in cosyvoice.inference_cross_lingual(
-            tts_text=chunk_info['target_text'],
+            tts_text=text,
             prompt_speech_16k=prompt_speech_16k,
             stream=False,
             speed=1.0  # Keep original timing
         ):
             audio_chunks.append(model_output['tts_speech'])
-            print("   .", end="", flush=True)
-        print()
-    except Exception as e:
-        print(f"\n❌ Error: {e}")
+    
+    return torch.cat(audio_chunks, dim=1) if audio_chunks else None
+
+def synthesize_lines(cosyvoice, texts, prompts):
+    """
+    Synthesize all lines of a segment, one after another.
+    A CosyVoice instance shares its frontend and LLM state (including the LLM's
+    CUDA stream) between calls, so calls into one model are never made concurrently.
+    Returns one speech tensor per line, or the exception raised for that line.
+    """
+    results = []
+    for text, prompt in zip(texts, prompts):
+        try:
+            results.append(synthesize_line(cosyvoice, text, prompt))
+        except Exception as e:
+            results.append(e)
+    return results
+
+def save_target_chunk(cosyvoice, chunk_info, prompt_speech_16k, audio, output_path, language="spanish"):
+    """
+    Save the generated target language vocals for a single chunk and report timing.
+    """
+    print(f"\n🎤 {language.capitalize()} Line {chunk_info['line_number']}:")
+    print(f"   Text: {chunk_info['target_text']}")
+    print(f"   Duration: {chunk_info['duration']:.2f}s")
+    if chunk_info.get('avg_pitch_hz'):
+        print(f"   Target Pitch: {chunk_info['avg_pitch_hz']:.1f} Hz")
+    print(f"   Reference duration: {prompt_speech_16k.shape[1]/16000:.2f}s @ 16kHz")
+    
+    if isinstance(audio, Exception):
+        print(f"❌ Error: {audio}")
         return None
     
-    # Concatenate and save
-    if audio_chunks:
-        audio = torch.cat(audio_chunks, dim=1)
+    # Save
+    if audio is not None:
         duration = audio.shape[1] / cosyvoice.sample_rate
         
-        torchaudio.save(output_path, audio, sample_rate=cosyvoice.sample_rate)
+        torchaudio.save(output_path, audio, sample_rate=cosyvoice.sample_rate, encoding="PCM_S", bits_per_sample=16)
         
         # Report timing difference
         ref_duration = chunk_info['duration']
@@ -284,96 +357,144 @@ def generate_target_chunk(cosyvoice, chunk_info, output_path, language="spanish"
     else:
         return None
 
-def merge_target_chunks(chunk_outputs, output_path, language="spanish"):
+def merge_target_chunks(chunk_audios, output_path, sample_rate, language="spanish"):
     """
     Merge all target language vocal chunks into final audio file.
+    Takes the in-memory line tensors (None for failed lines) and concatenates them once.
     """
     print("\n" + "="*70)
     print(f"MERGING {language.upper()} CHUNKS")
     print("="*70)
     
-    merged_audio = AudioSegment.empty()
+    parts = []
     
-    for i, chunk_path in enumerate(chunk_outputs):
-        if chunk_path and os.path.exists(chunk_path):
-            chunk = AudioSegment.from_wav(chunk_path)
-            merged_audio += chunk
-            print(f"✓ Added Line {i + 1}: {len(chunk)/1000:.2f}s")
+    for i, chunk in enumerate(chunk_audios):
+        if chunk is not None:
+            parts.append(chunk)
+            print(f"✓ Added Line {i + 1}: {chunk.shape[1]/sample_rate:.2f}s")
     
-    merged_audio.export(output_path, format="wav")
-    total_duration = len(merged_audio) / 1000.0
+    # One allocation for the whole segment instead of re-copying on every append
+    merged_audio = torch.cat(parts, dim=1) if parts else torch.zeros(1, 0)
+    torchaudio.save(output_path, merged_audio, sample_rate=sample_rate, encoding="PCM_S", bits_per_sample=16)
+    total_duration = merged_audio.shape[1] / sample_rate
     
     print(f"\n✅ Merged: {total_duration:.2f}s")
     return output_path
 
-def process_segment(segment_folder, target_lines, part_name, cosyvoice, workspace_root, language="spanish"):
+def load_segment_inputs(segment_folder):
     """
-    Process a single segment: create chunks, generate target language, merge.
+    CPU/IO stage of a segment: pick the audio and analysis files (trimmed if available),
+    parse the analysis into per-word arrays and decode the audio.
+    main() runs this ahead on a worker thread while the GPU is busy with the previous
+    segment, so problems are returned as {'error': ...} instead of printed.
     """
-    print("\n" + "="*70)
-    print(f"PROCESSING {part_name.upper()} - {language.upper()}")
-    print("="*70)
+    # Classify the folder's audio and analysis files in one directory pass
+    segment_files, trimmed_files = [], []
+    analysis_files, trimmed_json = [], []
+    for f in segment_folder.iterdir():
+        if f.name.startswith("segment_") and f.suffix == ".wav":
+            segment_files.append(f)
+            if 'trimmed' in f.name:
+                trimmed_files.append(f)
+        elif f.name.startswith("analysis_") and f.suffix == ".json":
+            analysis_files.append(f)
+            if 'trimmed' in f.name:
+                trimmed_json.append(f)
     
     # Find segment audio file
-    segment_files = list(segment_folder.glob("segment_*.wav"))
     if not segment_files:
-        print(f"❌ No segment audio found in {segment_folder.name}")
-        return None
+        return {'error': f"❌ No segment audio found in {segment_folder.name}"}
     
     # Prefer trimmed version if available
-    trimmed_files = [f for f in segment_files if 'trimmed' in f.name]
     segment_audio = trimmed_files[0] if trimmed_files else segment_files[0]
     
     # Find analysis JSON
-    analysis_files = list(segment_folder.glob("analysis_*.json"))
     if not analysis_files:
-        print(f"❌ No analysis JSON found")
-        return None
+        return {'error': f"❌ No analysis JSON found"}
     
     analysis_json = analysis_files[0]
-    if trimmed_files:
-        trimmed_json = [f for f in analysis_files if 'trimmed' in f.name]
-        if trimmed_json:
-            analysis_json = trimmed_json[0]
+    if trimmed_files and trimmed_json:
+        analysis_json = trimmed_json[0]
+    
+    # Load analysis and audio
+    with open(analysis_json, 'rb') as f:
+        analysis = orjson.loads(f.read())
+    words = word_arrays(analysis['transcription']['word_timings_dual_frame'])
+    waveform, sr = torchaudio.load(str(segment_audio))
+    
+    return {
+        'segment_audio': segment_audio,
+        'analysis_json': analysis_json,
+        'analysis': analysis,
+        'words': words,
+        'waveform': waveform,
+        'sr': sr
+    }
+
+def process_segment(segment_folder, target_lines, part_name, cosyvoice, workspace_root, language="spanish", inputs=None):
+    """
+    Process a single segment: create chunks, generate target language, merge.
+    `inputs` is a prefetched load_segment_inputs() result; loaded here if not given.
+    """
+    print("\n" + "="*70)
+    print(f"PROCESSING {part_name.upper()} - {language.upper()}")
+    print("="*70)
     
-    print(f"📁 Audio: {segment_audio.name}")
-    print(f"📄 Analysis: {analysis_json.name}")
+    if inputs is None:
+        inputs = load_segment_inputs(segment_folder)
+    if 'error' in inputs:
+        print(inputs['error'])
+        return None
     
-    # Load analysis
-    with open(analysis_json, 'r', encoding='utf-8') as f:
-        analysis = json.load(f)
+    analysis = inputs['analysis']
+    
+    print(f"📁 Audio: {inputs['segment_audio'].name}")
+    print(f"📄 Analysis: {inputs['analysis_json'].name}")
     
     duration = analysis['audio_analysis']['duration']
-    word_count = len(analysis['transcription']['word_timings_dual_frame'])
+    word_count = len(inputs['words']['text'])
     
     print(f"📊 Duration: {duration:.2f}s, Words: {word_count}")
     
+    # Resample the whole segment once; every line's prompt is a slice of it
+    prompt_16k = load_prompt_speech(inputs['waveform'], inputs['sr'])
+    
     # Create chunks - always create exactly 4 chunks per segment
-    chunks_dir = workspace_root / "data" / "temp_chunks" / f"{language}_{part_name}"
     chunks = create_line_chunks_from_json(
-        segment_audio_path=str(segment_audio),
-        analysis_data=analysis,
+        prompt_16k=prompt_16k,
+        words=inputs['words'],
         target_lines=target_lines,
-        output_dir=str(chunks_dir),
         language=language
     )
     
     if len(chunks) != 4:
         print(f"⚠️  Warning: Expected 4 chunks, got {len(chunks)}")
     
-    # Generate target language for each chunk
+    # Generate target language for each chunk (main() creates the folder)
     output_dir = workspace_root / "data" / "generated_vocals"
-    os.makedirs(output_dir, exist_ok=True)
+    
+    prompts = [chunk_info['prompt_16k'] for chunk_info in chunks]
+    
+    # Padded (empty) lines skip the model and become silence of the line's length
+    active = [i for i, c in enumerate(chunks) if c['target_text'].strip()]
+    results = [torch.zeros(1, int(c['duration'] * cosyvoice.sample_rate)) for c in chunks]
+    
+    print(f"\n🎤 Generating {len(active)} {language.capitalize()} lines...")
+    generated = synthesize_lines(cosyvoice, [chunks[i]['target_text'] for i in active],
+                                 [prompts[i] for i in active])
+    for i, audio in zip(active, generated):
+        results[i] = audio
     
     chunk_outputs = []
-    for chunk_info in chunks:
+    for chunk_info, prompt_speech_16k, audio in zip(chunks, prompts, results):
         output_path = output_dir / f"{language}_{part_name}_line_{chunk_info['line_number']}.wav"
-        result = generate_target_chunk(cosyvoice, chunk_info, str(output_path), language=language)
+        result = save_target_chunk(cosyvoice, chunk_info, prompt_speech_16k, audio, str(output_path), language=language)
         chunk_outputs.append(result)
     
     # Merge chunks
     final_output = output_dir / f"{language}_{part_name}_merged.wav"
-    merge_target_chunks(chunk_outputs, str(final_output), language=language)
+    chunk_audios = [audio if path else None for path, audio in zip(chunk_outputs, results)]
+    merge_target_chunks(chunk_audios, str(final_output), cosyvoice.sample_rate, language=language)
     
     print(f"\n✓ {part_name} complete: {final_output.name}")
     
@@ -401,7 +522,6 @@ def main():
     else:
         LYRICS = SPANISH_LYRICS
     
-    workspace_root = Path(__file__).parent
     analysis_base = workspace_root / "data" / "analysis"
     
     # Map segment time ranges to parts
@@ -429,11 +549,13 @@ def main():
     # Load CosyVoice model once
     print("\n🎶 Loading CosyVoice-300M model...")
     MODEL_NAME = "iic/CosyVoice-300M"
-    cosyvoice = CosyVoice(MODEL_NAME)
-    print("✅ Model loaded!")
+    # On GPU, run the LLM and flow-matching models in FP16 (HiFT stays FP32)
+    use_fp16 = torch.cuda.is_available()
+    cosyvoice = compile_model(CosyVoice(MODEL_NAME, fp16=use_fp16))
+    print(f"✅ Model loaded! ({'cuda fp16' if use_fp16 else 'cpu fp32'})")
     
-    # Process each segment
-    results = {}
+    # Match each folder to its part
+    jobs = []
     
     for folder in segment_folders:
         # Detect which part this is based on segment files
@@ -444,23 +566,33 @@ def main():
         segment_name = segment_files[0].stem.replace("segment_", "").replace("_trimmed", "")
         
         # Find matching part
-        part_name = None
-        target_lines = None
-        
-        for time_range, (pname, tlines) in segment_mapping.items():
-            if time_range in segment_name:
-                part_name = pname
-                target_lines = tlines
-                break
+        m = PART_RE.search(segment_name)
+        part_name, target_lines = segment_mapping.get(m.group(1), (None, None)) if m else (None, None)
         
         if not part_name:
             print(f"\n⚠️  Skipping {folder.name} - no mapping found")
             continue
         
-        # Process this segment
-        result = process_segment(folder, target_lines, part_name, cosyvoice, workspace_root, language=language)
-        if result:
-            results[part_name] = result
+        jobs.append((folder, part_name, target_lines))
+    
+    os.makedirs(workspace_root / "data" / "generated_vocals", exist_ok=True)
+    
+    # Process each segment. File loading and JSON parsing for the next
+    # PREFETCH_DEPTH segments run on worker threads while the current one is on
+    # the GPU; only that window of decoded inputs is held in memory at a time.
+    results = {}
+    
+    with ThreadPoolExecutor(max_workers=PREFETCH_DEPTH) as prefetch:
+        pending = deque()
+        for i, (folder, part_name, target_lines) in enumerate(jobs):
+            # Top up to the current segment plus PREFETCH_DEPTH upcoming ones
+            while len(pending) <= PREFETCH_DEPTH and i + len(pending) < len(jobs):
+                pending.append(prefetch.submit(load_segment_inputs, jobs[i + len(pending)][0]))
+            
+            result = process_segment(folder, target_lines, part_name, cosyvoice, workspace_root,
+                                     language=language, inputs=pending.popleft().result())
+            if result:
+                results[part_name] = result
     
     # Summary
     print("\n" + "="*70)
@@ -1,10 +1,13 @@
 import os
 import sys
 import json
+import argparse
+import contextlib
 import torch
 import torchaudio
 from pathlib import Path
-from pydub import AudioSegment
+import soundfile as sf
+from concurrent.futures import ThreadPoolExecutor
 
 # --- Path Setup ---
 repo_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "external", "CosyVoice"))
@@ -15,18 +18,23 @@ matcha_path = os.path.join(repo_root, "third_party", "Matcha-TTS")
 if matcha_path not in sys.path:
     sys.path.insert(0, matcha_path)
 
-from cosyvoice.cli.cosyvoice import CosyVoice
+from cosyvoice_server import load_cosyvoice, get_resampler
 
-def create_line_chunks(segment_audio_path, analysis_data, output_dir):
+# Inference only: no autograd bookkeeping, and let cuDNN autotune the repeated shapes
+torch.set_grad_enabled(False)
+torch.backends.cudnn.benchmark = True
+
+
+def create_line_chunks(prompt_16k, analysis_data):
     """
     Split the segment into chunks per line based on word timings.
-    Returns list of chunk paths and their corresponding line texts.
+    Returns each line's 16kHz prompt slice and its corresponding line text.
     """
     print("\n" + "="*70)
     print("CREATING LINE-BASED CHUNKS")
     print("="*70)
     
-    audio = AudioSegment.from_wav(segment_audio_path)
+    audio_length_ms = prompt_16k.shape[1] / 16
     word_timings = analysis_data['transcription']['word_timings_dual_frame']
     
     # Spanish lyrics split by lines
@@ -51,7 +59,6 @@ def create_line_chunks(segment_audio_path, analysis_data, output_dir):
     ]
     
     chunks = []
-    os.makedirs(output_dir, exist_ok=True)
     
     for line_idx, (start_word_idx, end_word_idx) in enumerate(line_word_ranges):
         # Get time range for this line
@@ -61,23 +68,19 @@ def create_line_chunks(segment_audio_path, analysis_data, output_dir):
         # Extract chunk with padding
         padding_ms = 100  # 100ms padding
         chunk_start = max(0, start_time_ms - padding_ms)
-        chunk_end = min(len(audio), end_time_ms + padding_ms)
-        
-        chunk_audio = audio[chunk_start:chunk_end]
+        chunk_end = min(audio_length_ms, end_time_ms + padding_ms)
         
-        # Save chunk
-        chunk_path = os.path.join(output_dir, f"chunk_line_{line_idx + 1}.wav")
-        chunk_audio.export(chunk_path, format="wav")
+        # Slice the already resampled reference (16 samples per ms)
+        chunk_prompt = prompt_16k[:, int(chunk_start * 16):int(chunk_end * 16)]
         
         duration = (chunk_end - chunk_start) / 1000.0
         print(f"✓ Line {line_idx + 1}: {duration:.2f}s ({start_time_ms/1000:.2f}s - {end_time_ms/1000:.2f}s)")
         print(f"   Portuguese: {' '.join([word_timings[i]['word'] for i in range(start_word_idx, end_word_idx + 1)])}")
         print(f"   Spanish: {spanish_lines[line_idx]}")
-        print(f"   Saved: {chunk_path}")
         
         chunks.append({
             'line_number': line_idx + 1,
-            'chunk_path': chunk_path,
+            'prompt_16k': chunk_prompt,
             'spanish_text': spanish_lines[line_idx],
             'duration': duration,
             'time_range': (start_time_ms / 1000, end_time_ms / 1000)
@@ -86,16 +89,12 @@ def create_line_chunks(segment_audio_path, analysis_data, output_dir):
     return chunks
 
 
-def generate_spanish_chunk(cosyvoice, chunk_info, output_path):
+def load_prompt_speech(segment_audio_path):
     """
-    Generate Spanish vocals for a single chunk.
+    Load the segment once as the mono 16kHz prompt signal CosyVoice expects.
+    The line chunks slice the result.
     """
-    print(f"\n🎤 Generating Spanish for Line {chunk_info['line_number']}...")
-    print(f"   Reference: {os.path.basename(chunk_info['chunk_path'])}")
-    print(f"   Text: {chunk_info['spanish_text']}")
-    
-    # Load reference audio
-    ref_waveform, sr = torchaudio.load(chunk_info['chunk_path'])
+    ref_waveform, sr = torchaudio.load(segment_audio_path)
     
     # Convert stereo to mono if needed
     if ref_waveform.shape[0] > 1:
@@ -103,64 +102,113 @@ def generate_spanish_chunk(cosyvoice, chunk_info, output_path):
     
     # Resample to 16kHz
     if sr != 16000:
-        resampler = torchaudio.transforms.Resample(orig_freq=sr, new_freq=16000)
-        prompt_speech_16k = resampler(ref_waveform)
+        prompt_speech_16k = get_resampler(sr)(ref_waveform)
     else:
         prompt_speech_16k = ref_waveform
     
-    # Generate Spanish vocals
+    return prompt_speech_16k
+
+
+def synthesize_line(cosyvoice, text, prompt_speech_16k, output_path=None):
+    """
+    Run one streaming cross-lingual inference and return the concatenated speech tensor.
+    With an output_path, speech chunks are also appended to that file as they
+    arrive, while the model keeps generating the rest.
+    """
     audio_chunks = []
     try:
-        for model_output in cosyvoice.inference_cross_lingual(
-            tts_text=chunk_info['spanish_text'],
-            prompt_speech_16k=prompt_speech_16k,
-            stream=False,
-            speed=1.0
-        ):
-            audio_chunks.append(model_output['tts_speech'])
-            print("   .", end="", flush=True)
-        print()
-    except Exception as e:
-        print(f"\n❌ Error: {e}")
+        with (sf.SoundFile(output_path, 'w', samplerate=cosyvoice.sample_rate, channels=1, subtype='FLOAT')
+              if output_path else contextlib.nullcontext()) as f, torch.inference_mode():
+            for model_output in cosyvoice.inference_cross_lingual(
+                tts_text=text,
+                prompt_speech_16k=prompt_speech_16k,
+                stream=True,
+                speed=1.0
+            ):
+                if f is not None:
+                    f.write(model_output['tts_speech'][0].numpy())
+                audio_chunks.append(model_output['tts_speech'])
+    except Exception:
+        # Don't leave a truncated line behind
+        if output_path and os.path.exists(output_path):
+            os.remove(output_path)
+        raise
+    
+    if not audio_chunks:
+        if output_path:
+            os.remove(output_path)
         return None
     
-    # Concatenate and save
-    if audio_chunks:
-        audio = torch.cat(audio_chunks, dim=1)
+    return torch.cat(audio_chunks, dim=1)
+
+
+def synthesize_spanish_lines(cosyvoice, chunks, output_paths):
+    """
+    Generate Spanish vocals for all line chunks, one line at a time.
+    The CosyVoice instance shares frontend and LLM state between calls, so it
+    is never called concurrently.
+    Lines with an output path (not None) are written to it while they stream.
+    Returns one speech tensor per line, or the exception raised for that line.
+    """
+    results = []
+    for chunk_info, path in zip(chunks, output_paths):
+        try:
+            results.append(synthesize_line(cosyvoice, chunk_info['spanish_text'], chunk_info['prompt_16k'], path))
+        except Exception as e:
+            results.append(e)
+    return results
+
+
+def generate_spanish_chunk(cosyvoice, chunk_info, audio, output_path=None):
+    """
+    Report the generated Spanish vocals for a single chunk.
+    Returns the speech tensor, or None if the line failed. The line file, if
+    requested, was written while the line streamed.
+    """
+    print(f"\n🎤 Spanish Line {chunk_info['line_number']}:")
+    print(f"   Reference: {chunk_info['prompt_16k'].shape[1]/16000:.2f}s @ 16kHz")
+    print(f"   Text: {chunk_info['spanish_text']}")
+    
+    if isinstance(audio, Exception):
+        print(f"❌ Error: {audio}")
+        return None
+    
+    if audio is not None:
         duration = audio.shape[1] / cosyvoice.sample_rate
         
-        torchaudio.save(output_path, audio, sample_rate=cosyvoice.sample_rate)
         print(f"✅ Generated: {duration:.2f}s @ {cosyvoice.sample_rate}Hz")
-        print(f"   Saved: {output_path}")
+        if output_path:
+            print(f"   Saved: {output_path}")
         
-        return output_path
+        return audio
     else:
         print("❌ No audio generated")
         return None
 
 
-def merge_spanish_chunks(chunk_outputs, output_path, target_sample_rate=22050):
+def merge_spanish_chunks(chunk_audios, output_path, sample_rate=22050):
     """
     Merge all Spanish vocal chunks into final audio file.
+    Takes the in-memory line tensors (None for failed lines) and concatenates them once.
     """
     print("\n" + "="*70)
     print("MERGING SPANISH VOCAL CHUNKS")
     print("="*70)
     
-    merged_audio = AudioSegment.empty()
+    parts = []
     
-    for i, chunk_path in enumerate(chunk_outputs):
-        if chunk_path and os.path.exists(chunk_path):
-            chunk = AudioSegment.from_wav(chunk_path)
-            merged_audio += chunk
-            print(f"✓ Added Line {i + 1}: {len(chunk)/1000:.2f}s")
+    for i, chunk in enumerate(chunk_audios):
+        if chunk is not None:
+            parts.append(chunk)
+            print(f"✓ Added Line {i + 1}: {chunk.shape[1]/sample_rate:.2f}s")
         else:
-            print(f"⚠️  Skipped Line {i + 1}: file not found")
+            print(f"⚠️  Skipped Line {i + 1}: not generated")
     
-    # Export merged audio
-    merged_audio.export(output_path, format="wav")
+    # Concatenate once and export merged audio
+    merged_audio = torch.cat(parts, dim=1) if parts else torch.zeros(1, 0)
+    torchaudio.save(output_path, merged_audio, sample_rate=sample_rate, encoding="PCM_S", bits_per_sample=16)
     
-    total_duration = len(merged_audio) / 1000.0
+    total_duration = merged_audio.shape[1] / sample_rate
     print(f"\n✅ Merged audio saved: {output_path}")
     print(f"   Total duration: {total_duration:.2f}s")
     
@@ -168,6 +216,11 @@ def merge_spanish_chunks(chunk_outputs, output_path, target_sample_rate=22050):
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Generate Spanish vocals for the 6-23s segment, line by line.")
+    parser.add_argument("--save-intermediates", action="store_true",
+                        help="Also write each generated line to spanish_line_N.wav")
+    args = parser.parse_args()
+    
     workspace_root = Path(__file__).parent
     
     # Find the first segment (6-23s trimmed)
@@ -202,6 +255,12 @@ def main():
     print(f"\n📁 Using segment: {target_folder.name}")
     print(f"   Audio: {segment_audio.name}")
     
+    # Start loading the model on a worker thread; the analysis and reference audio
+    # below are prepared while the weights load
+    MODEL_NAME = "iic/CosyVoice-300M"
+    loader = ThreadPoolExecutor(max_workers=1)
+    model_future = loader.submit(load_cosyvoice, MODEL_NAME)  # warm server model if one is running
+    
     # Load analysis
     with open(analysis_json, 'r', encoding='utf-8') as f:
         analysis = json.load(f)
@@ -211,15 +270,10 @@ def main():
     print(f"   Words: {len(analysis['transcription']['word_timings_dual_frame'])}")
     print(f"   Portuguese: {analysis['transcription']['full_text']}")
     
-    # Create chunks directory
-    chunks_dir = workspace_root / "data" / "temp_chunks"
-    os.makedirs(chunks_dir, exist_ok=True)
-    
-    # Step 1: Create line-based chunks
+    # Step 1: Create line-based chunks from the segment, loaded and resampled once
     chunks = create_line_chunks(
-        segment_audio_path=str(segment_audio),
-        analysis_data=analysis,
-        output_dir=str(chunks_dir)
+        prompt_16k=load_prompt_speech(str(segment_audio)),
+        analysis_data=analysis
     )
     
     print(f"\n✓ Created {len(chunks)} line chunks")
@@ -228,8 +282,8 @@ def main():
     print("\n" + "="*70)
     print("LOADING COSYVOICE MODEL")
     print("="*70)
-    MODEL_NAME = "iic/CosyVoice-300M"
-    cosyvoice = CosyVoice(MODEL_NAME)
+    cosyvoice = model_future.result()
+    loader.shutdown()
     print("✅ Model loaded successfully!")
     
     # Step 3: Generate Spanish for each chunk
@@ -240,24 +294,31 @@ def main():
     output_dir = workspace_root / "data" / "generated_vocals"
     os.makedirs(output_dir, exist_ok=True)
     
-    chunk_outputs = []
-    for chunk_info in chunks:
-        output_path = output_dir / f"spanish_line_{chunk_info['line_number']}.wav"
-        result = generate_spanish_chunk(cosyvoice, chunk_info, str(output_path))
-        chunk_outputs.append(result)
+    # Per-line files only if asked for
+    if args.save_intermediates:
+        output_paths = [str(output_dir / f"spanish_line_{chunk_info['line_number']}.wav") for chunk_info in chunks]
+    else:
+        output_paths = [None] * len(chunks)
+    print(f"\n🎤 Generating {len(chunks)} Spanish lines...")
+    results = synthesize_spanish_lines(cosyvoice, chunks, output_paths)
+    
+    chunk_audios = []
+    for chunk_info, audio, output_path in zip(chunks, results, output_paths):
+        chunk_audios.append(generate_spanish_chunk(cosyvoice, chunk_info, audio, output_path))
     
     # Step 4: Merge all chunks
     final_output = output_dir / "spanish_segment_1_merged.wav"
-    merge_spanish_chunks(chunk_outputs, str(final_output))
+    merge_spanish_chunks(chunk_audios, str(final_output), cosyvoice.sample_rate)
     
     print("\n" + "="*70)
     print("✓ GENERATION COMPLETE!")
     print("="*70)
     print(f"\n📁 Output files:")
-    print(f"   Individual lines: {output_dir}")
-    for i, path in enumerate(chunk_outputs):
-        if path:
-            print(f"     - Line {i+1}: {os.path.basename(path)}")
+    if args.save_intermediates:
+        print(f"   Individual lines: {output_dir}")
+        for i, (path, audio) in enumerate(zip(output_paths, chunk_audios)):
+            if audio is not None:
+                print(f"     - Line {i+1}: {os.path.basename(path)}")
     print(f"   Merged file: {final_output.name}")
     print("="*70)
 
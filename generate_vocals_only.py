@@ -13,7 +13,11 @@ matcha_path = os.path.join(repo_root, "third_party", "Matcha-TTS")
 if matcha_path not in sys.path:
     sys.path.insert(0, matcha_path)
 
-from cosyvoice.cli.cosyvoice import CosyVoice
+from cosyvoice_server import load_cosyvoice, get_resampler
+
+# Inference only: no autograd bookkeeping, and let cuDNN autotune the repeated shapes
+torch.set_grad_enabled(False)
+torch.backends.cudnn.benchmark = True
 
 # --- Directories ---
 CHUNKS_DIR = "data/separated/chunks"       # Directory where split_vocals.py saved chunks
@@ -32,7 +36,7 @@ languages = {
 
 # --- Load Model ---
 print("🎶 Loading CosyVoice model... please wait.")
-cosyvoice = CosyVoice(MODEL_NAME)
+cosyvoice = load_cosyvoice(MODEL_NAME)  # warm server model if one is running
 print("✅ Model loaded successfully!")
 
 # --- Process Each Chunk ---
@@ -46,7 +50,44 @@ if not chunk_files:
 
 print(f"🎤 Found {len(chunk_files)} vocal chunks to process.\n")
 
+
+def load_prompt_speech(chunk_path):
+    """
+    Load a chunk as the mono 16kHz prompt CosyVoice expects.
+    """
+    ref_waveform, sr = torchaudio.load(chunk_path)
+
+    # --- Fix stereo to mono (CosyVoice expects 1 channel) ---
+    if ref_waveform.shape[0] > 1:
+        ref_waveform = torch.mean(ref_waveform, dim=0, keepdim=True)
+
+    # --- Resample to 16kHz (required by CosyVoice) ---
+    if sr != 16000:
+        return get_resampler(sr)(ref_waveform)
+    return ref_waveform
+
+
+# The prompts are the same for every language, so they are prepared once
+prompts = [load_prompt_speech(chunk_path) for chunk_path in chunk_files]
+
 # --- Generate Vocals for Each Language ---
+def synthesize(cosyvoice, text, prompt_speech_16k):
+    """
+    Run one cross-lingual inference and return the concatenated speech tensor.
+    """
+    audio_chunks = []
+    with torch.inference_mode():
+        for model_output in cosyvoice.inference_cross_lingual(
+            tts_text=text,
+            prompt_speech_16k=prompt_speech_16k,
+            stream=False,
+            speed=1.0
+        ):
+            audio_chunks.append(model_output['tts_speech'])
+    return torch.cat(audio_chunks, dim=1) if audio_chunks else None
+
+
+jobs = []
 for lang, filename in languages.items():
     lyric_path = os.path.join(TRANSCRIPTS_DIR, filename)
     if not os.path.exists(lyric_path):
@@ -54,49 +95,30 @@ for lang, filename in languages.items():
         continue
 
     with open(lyric_path, "r", encoding="utf-8") as f:
-        lyrics = f.read().strip()
-
-    print(f"\n🎧 Generating vocals in {lang.capitalize()} using {len(chunk_files)} chunks...")
-
-    for idx, chunk_path in enumerate(chunk_files):
-        print(f"🎵 Processing chunk {idx + 1}/{len(chunk_files)}: {os.path.basename(chunk_path)}")
+        jobs.append((lang, f.read().strip()))
 
-        # Load chunk
-        ref_waveform, sr = torchaudio.load(chunk_path)
+print(f"\n🎧 Generating vocals in {', '.join(lang.capitalize() for lang, _ in jobs)} using {len(chunk_files)} chunks...")
 
-        # --- Fix stereo to mono (CosyVoice expects 1 channel) ---
-        if ref_waveform.shape[0] > 1:
-            ref_waveform = torch.mean(ref_waveform, dim=0, keepdim=True)
-
-        # --- Resample to 16kHz (required by CosyVoice) ---
-        if sr != 16000:
-            resampler = torchaudio.transforms.Resample(orig_freq=sr, new_freq=16000)
-            prompt_speech_16k = resampler(ref_waveform)
-        else:
-            prompt_speech_16k = ref_waveform
+# Each chunk's prompt is shared by every language, so the languages run back to
+# back per chunk. Calls into the one CosyVoice instance are never concurrent.
+for idx, (chunk_path, prompt_speech_16k) in enumerate(zip(chunk_files, prompts)):
+    print(f"🎵 Processing chunk {idx + 1}/{len(chunk_files)}: {os.path.basename(chunk_path)}")
 
+    for lang, lyrics in jobs:
         # --- Generate vocals for this chunk ---
-        audio_chunks = []
         try:
-            for model_output in cosyvoice.inference_cross_lingual(
-                tts_text=lyrics,
-                prompt_speech_16k=prompt_speech_16k,
-                stream=False,
-                speed=1.0
-            ):
-                audio_chunks.append(model_output['tts_speech'])
+            audio = synthesize(cosyvoice, lyrics, prompt_speech_16k)
         except Exception as e:
-            print(f"❌ Error processing chunk {idx}: {e}")
+            print(f"❌ [{lang}] Error processing chunk {idx}: {e}")
             continue
 
-        # --- Concatenate and save chunk output ---
-        if audio_chunks:
-            audio = torch.cat(audio_chunks, dim=1)
+        # --- Save chunk output ---
+        if audio is not None:
             output_path = os.path.join(OUTPUT_DIR, f"vocals_{lang}_chunk_{idx}.wav")
             torchaudio.save(output_path, audio, sample_rate=cosyvoice.sample_rate)
             print(f"✅ Saved: {output_path}")
         else:
-            print(f"⚠️ No output generated for chunk {idx}")
+            print(f"⚠️ [{lang}] No output generated for chunk {idx}")
 
 print("\n🎉 All vocal chunks generated successfully!")
 print(f"🗂️  Output directory: {os.path.abspath(OUTPUT_DIR)}")
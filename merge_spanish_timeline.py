@@ -1,12 +1,20 @@
 import os
+import re
 import json
+import functools
 from pathlib import Path
-from pydub import AudioSegment
+import librosa
 import numpy as np
+from audio_np import load_wav, save_wav, match_format, mix_at
 
+# Time-range key in a segment file name, e.g. "6-23s" in segment_6-23s_trimmed.wav
+PART_RE = re.compile(r'(\d+-\d+s)')
+
+@functools.lru_cache(maxsize=None)
 def load_segment_analysis(segment_folder):
     """
     Load the analysis JSON to get absolute time frame information.
+    Cached per folder: the timing report and the merge both read every analysis.
     """
     analysis_files = list(segment_folder.glob("analysis_*.json"))
     if not analysis_files:
@@ -19,6 +27,13 @@ def load_segment_analysis(segment_folder):
     with open(analysis_path, 'r', encoding='utf-8') as f:
         return json.load(f)
 
+def time_scale(samples, speed_factor):
+    """
+    Shorten (frames, channels) samples by speed_factor with a phase-vocoder
+    time stretch, which keeps the sung pitch.
+    """
+    return np.ascontiguousarray(librosa.effects.time_stretch(samples.T, rate=speed_factor).T)
+
 def merge_vocals_to_timeline(workspace_root, language="spanish"):
     """
     Merge all vocal segment parts into a single timeline based on absolute timestamps.
@@ -63,11 +78,8 @@ def merge_vocals_to_timeline(workspace_root, language="spanish"):
         
         segment_name = segment_files[0].stem.replace("segment_", "").replace("_trimmed", "")
         
-        part_name = None
-        for time_key, pname in part_mapping.items():
-            if time_key in segment_name:
-                part_name = pname
-                break
+        m = PART_RE.search(segment_name)
+        part_name = part_mapping.get(m.group(1)) if m else None
         
         if not part_name:
             print(f"⚠️  Skipping {folder.name} - no part mapping found")
@@ -110,22 +122,25 @@ def merge_vocals_to_timeline(workspace_root, language="spanish"):
     
     # Calculate total duration needed
     max_end_time = max(seg['end_time'] for seg in segment_info)
-    total_duration_ms = int(max_end_time * 1000)
     
     print(f"\n🎵 Creating timeline: 0s - {max_end_time:.1f}s ({max_end_time:.1f}s total)")
     
-    # Create silent base track
+    # Load vocal audio; the timeline uses the highest rate and channel count among them
+    vocals = [load_wav(seg['vocal_file']) for seg in segment_info]
+    sr = max(vocal_sr for _, vocal_sr in vocals)
+    channels = max(data.shape[1] for data, _ in vocals)
+    
+    # Create silent base track, allocated once
     print("\n📝 Building merged track...")
-    base_track = AudioSegment.silent(duration=total_duration_ms)
+    base_track = np.zeros((int(max_end_time * sr), channels), dtype=np.float32)
     
     # Overlay each vocal segment at its absolute position
-    for seg in segment_info:
+    for seg, (vocal_audio, vocal_sr) in zip(segment_info, vocals):
         print(f"\n   Adding {seg['actual_part']}:")
         print(f"   Position: {seg['start_time']:.2f}s - {seg['end_time']:.2f}s")
         
-        # Load vocal audio
-        vocal_audio = AudioSegment.from_wav(seg['vocal_file'])
-        vocal_duration = len(vocal_audio) / 1000.0
+        vocal_audio = match_format(vocal_audio, vocal_sr, sr, channels)
+        vocal_duration = len(vocal_audio) / sr
         
         print(f"   Vocal duration: {vocal_duration:.2f}s")
         print(f"   Target duration: {seg['duration']:.2f}s")
@@ -138,22 +153,22 @@ def merge_vocals_to_timeline(workspace_root, language="spanish"):
             if vocal_duration > seg['duration']:
                 # Speed up slightly
                 speed_factor = vocal_duration / seg['duration']
-                vocal_audio = vocal_audio.speedup(playback_speed=speed_factor)
+                vocal_audio = time_scale(vocal_audio, speed_factor)
                 print(f"   Adjusted speed by {speed_factor:.2f}x to fit timeline")
         
         # Calculate overlay position
-        overlay_position_ms = int(seg['start_time'] * 1000)
+        overlay_position = int(seg['start_time'] * sr)
         
         # Overlay at the absolute position
-        base_track = base_track.overlay(vocal_audio, position=overlay_position_ms)
+        mix_at(base_track, vocal_audio, overlay_position)
         
         print(f"   ✓ Overlaid at {seg['start_time']:.2f}s")
     
     # Export merged track
     output_path = workspace_root / "data" / "generated_vocals" / f"{language}_full_vocals_merged.wav"
-    base_track.export(str(output_path), format="wav")
+    save_wav(output_path, base_track, sr)
     
-    final_duration = len(base_track) / 1000.0
+    final_duration = len(base_track) / sr
     
     print("\n" + "="*70)
     print("✓ MERGE COMPLETE!")
@@ -1,5 +1,6 @@
-from pydub import AudioSegment
+import numpy as np
 from pathlib import Path
+from audio_np import load_wav, save_wav, match_format, mix_at
 
 def mix_vocals_with_instrumental(vocals_path, instrumental_path, output_path, vocals_volume=0, instrumental_volume=-2):
     """
@@ -18,49 +19,54 @@ def mix_vocals_with_instrumental(vocals_path, instrumental_path, output_path, vo
     
     # Load audio files
     print("\n📁 Loading files...")
-    vocals = AudioSegment.from_wav(vocals_path)
-    instrumental = AudioSegment.from_wav(instrumental_path)
+    vocals, vocals_sr = load_wav(vocals_path)
+    instrumental, instrumental_sr = load_wav(instrumental_path)
     
-    vocals_duration = len(vocals) / 1000.0
-    instrumental_duration = len(instrumental) / 1000.0
+    vocals_duration = len(vocals) / vocals_sr
+    instrumental_duration = len(instrumental) / instrumental_sr
     
     print(f"   Vocals: {vocals_duration:.2f}s")
     print(f"   Instrumental: {instrumental_duration:.2f}s")
     
-    # Adjust volumes
+    # Bring both tracks to the higher sample rate and channel count
+    sr = max(vocals_sr, instrumental_sr)
+    channels = max(vocals.shape[1], instrumental.shape[1])
+    vocals = match_format(vocals, vocals_sr, sr, channels)
+    instrumental = match_format(instrumental, instrumental_sr, sr, channels)
+    
     if vocals_volume != 0:
-        vocals = vocals + vocals_volume
         print(f"   Vocals volume: {vocals_volume:+.1f} dB")
     
     if instrumental_volume != 0:
-        instrumental = instrumental + instrumental_volume
         print(f"   Instrumental volume: {instrumental_volume:+.1f} dB")
     
     # Ensure both tracks have the same length (use longer duration)
     max_duration = max(len(vocals), len(instrumental))
     
     if len(vocals) < max_duration:
-        # Pad vocals with silence
-        silence_duration = max_duration - len(vocals)
-        vocals = vocals + AudioSegment.silent(duration=silence_duration)
-        print(f"   Padded vocals with {silence_duration/1000:.2f}s silence")
+        # Vocals are shorter; the rest of the buffer stays silent
+        print(f"   Padded vocals with {(max_duration - len(vocals))/sr:.2f}s silence")
     
     if len(instrumental) < max_duration:
-        # Pad instrumental with silence
-        silence_duration = max_duration - len(instrumental)
-        instrumental = instrumental + AudioSegment.silent(duration=silence_duration)
-        print(f"   Padded instrumental with {silence_duration/1000:.2f}s silence")
+        # Instrumental is shorter; the rest of the buffer stays silent
+        print(f"   Padded instrumental with {(max_duration - len(instrumental))/sr:.2f}s silence")
     
-    # Mix the tracks
+    # Mix the tracks: the longer one, scaled by its gain, becomes the output buffer
+    # and the shorter one is added into it in place
     print("\n🎵 Mixing tracks...")
-    mixed = vocals.overlay(instrumental)
+    if len(vocals) >= len(instrumental):
+        mixed = vocals * np.float32(10 ** (vocals_volume / 20))
+        mix_at(mixed, instrumental, 0, gain_db=instrumental_volume)
+    else:
+        mixed = instrumental * np.float32(10 ** (instrumental_volume / 20))
+        mix_at(mixed, vocals, 0, gain_db=vocals_volume)
     
-    mixed_duration = len(mixed) / 1000.0
+    mixed_duration = len(mixed) / sr
     print(f"   Mixed duration: {mixed_duration:.2f}s")
     
     # Export
     print(f"\n💾 Exporting to: {output_path}")
-    mixed.export(output_path, format="wav")
+    save_wav(output_path, mixed, sr)
     
     print("✅ Mix complete!")
     
@@ -1,18 +1,43 @@
 # src/separate_vocals.py
 import os
-import subprocess
-import sys
+import functools
+from pathlib import Path
+import torch
+import torchaudio
+from demucs.pretrained import get_model
+from demucs.apply import apply_model
+from demucs.audio import convert_audio, save_audio
 
-def separate_audio(input_path, output_dir="data/separated"):
+@functools.lru_cache(maxsize=2)
+def get_separator(model_name="mdx_extra"):
+    """
+    Load a Demucs model once per process; repeated separations reuse it.
+    """
+    model = get_model(model_name)
+    model.eval()
+    return model
+
+def separate_audio(input_path, output_dir="data/separated", model_name="mdx_extra"):
     os.makedirs(output_dir, exist_ok=True)
 
-    command = [
-        sys.executable, "-m", "demucs.separate",
-        "-n", "mdx_extra",
-        input_path,
-        "--out", output_dir
-    ]
-    subprocess.run(command, check=True)
+    model = get_separator(model_name)
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+
+    wav, sr = torchaudio.load(input_path)
+    wav = convert_audio(wav, sr, model.samplerate, model.audio_channels)
+
+    # Normalize like `python -m demucs.separate` does, and undo it on the stems
+    ref = wav.mean(0)
+    wav = (wav - ref.mean()) / ref.std()
+    with torch.inference_mode():
+        sources = apply_model(model, wav[None], device=device, shifts=0, split=True, overlap=0.25, progress=True)[0]
+    sources = sources * ref.std() + ref.mean()
+
+    # Same layout as the CLI: <output_dir>/<model>/<track>/<stem>.wav
+    track_dir = Path(output_dir) / model_name / Path(input_path).stem
+    track_dir.mkdir(parents=True, exist_ok=True)
+    for source, name in zip(sources, model.sources):
+        save_audio(source, str(track_dir / f"{name}.wav"), samplerate=model.samplerate)
 
 if __name__ == "__main__":
     input_file = r"data/raw/Amigos para Sempre - Giramille ｜ Desenho Animado Musical.wav"
@@ -1,5 +1,6 @@
-from pydub import AudioSegment
+import soxr
 from pathlib import Path
+from audio_np import load_wav, save_wav
 
 def slow_down_audio(input_path, output_path, speed_factor=0.8):
     """
@@ -14,27 +15,23 @@ def slow_down_audio(input_path, output_path, speed_factor=0.8):
     print(f"Speed factor: {speed_factor}x (20% slower)")
     
     # Load audio
-    audio = AudioSegment.from_wav(input_path)
-    original_duration = len(audio) / 1000.0
+    audio, sr = load_wav(input_path)
+    original_duration = len(audio) / sr
     
     print(f"Original duration: {original_duration:.2f}s")
     
     # Slow down by changing frame rate
-    # Lower frame rate = slower playback
-    slowed_audio = audio._spawn(audio.raw_data, overrides={
-        "frame_rate": int(audio.frame_rate * speed_factor)
-    })
+    # Lower frame rate = slower playback: treat the samples as int(sr * speed_factor)
+    # and resample them back to the original rate in one pass
+    slowed_audio = soxr.resample(audio, int(sr * speed_factor), sr)
     
-    # Convert back to original sample rate to maintain quality
-    slowed_audio = slowed_audio.set_frame_rate(audio.frame_rate)
-    
-    new_duration = len(slowed_audio) / 1000.0
+    new_duration = len(slowed_audio) / sr
     
     print(f"New duration: {new_duration:.2f}s")
     print(f"Difference: +{new_duration - original_duration:.2f}s")
     
     # Export
-    slowed_audio.export(output_path, format="wav")
+    save_wav(output_path, slowed_audio, sr)
     
     print(f"\n✅ Saved: {output_path}")
     print("="*70)
@@ -0,0 +1,46 @@
+import os
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+import soundfile as sf
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from analyze_vocals_precise import auto_detect_vocal_region
+
+
+def write_track(path, sr, duration, vocal_start, vocal_end):
+    """
+    Quiet noise bed for the whole track with a loud tone between vocal_start and vocal_end.
+    """
+    rng = np.random.default_rng(0)
+    t = np.arange(int(duration * sr)) / sr
+    y = 0.01 * rng.standard_normal(len(t))
+    vocal = (t >= vocal_start) & (t < vocal_end)
+    y[vocal] += 0.5 * np.sin(2 * np.pi * 440 * t[vocal])
+    sf.write(path, y.astype(np.float32), sr)
+
+
+class AutoDetectVocalRegionTest(unittest.TestCase):
+    def detect(self, duration, vocal_start, vocal_end):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "vocals.wav")
+            write_track(path, 22050, duration, vocal_start, vocal_end)
+            return auto_detect_vocal_region(path)
+    
+    def test_late_starting_vocals(self):
+        # Vocals after a long intro must not be cut off at a leading scan window
+        start, end = self.detect(duration=120, vocal_start=50, vocal_end=110)
+        self.assertAlmostEqual(start, 50, delta=0.2)
+        self.assertAlmostEqual(end, 75, delta=0.2)
+    
+    def test_early_vocals(self):
+        start, end = self.detect(duration=90, vocal_start=5, vocal_end=60)
+        self.assertAlmostEqual(start, 5, delta=0.2)
+        self.assertAlmostEqual(end, 30, delta=0.2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,116 +1,297 @@
+import io
 import os
-import json
+import sys
+import argparse
+import functools
+import bisect
+import orjson
+import struct
+import wave
 from pathlib import Path
-from pydub import AudioSegment
+import soundfile as sf
+from concurrent.futures import ThreadPoolExecutor
 
-def trim_segment_to_word(analysis_folder, target_word="feliz"):
+# Plausible segment header bounds; anything outside is treated as a malformed file
+MIN_SAMPLE_RATE, MAX_SAMPLE_RATE = 8000, 384000
+MAX_CHANNELS = 8
+
+BANNER = "=" * 70
+WAV_HEADER_SIZE = 44
+
+
+def header_problem(info, trim_frames):
+    """
+    Sanity-check a segment's header before any samples are read.
+    Returns a description of the problem, or None if it looks sane.
+    """
+    if not MIN_SAMPLE_RATE <= info.samplerate <= MAX_SAMPLE_RATE:
+        return f"implausible sample rate {info.samplerate} Hz"
+    if not 1 <= info.channels <= MAX_CHANNELS:
+        return f"implausible channel count {info.channels}"
+    # Allow 10 ms of slack for word timestamps rounded past the last sample
+    if trim_frames > info.frames + info.samplerate // 100:
+        return f"trim point ({trim_frames} frames) is past the end of the audio ({info.frames} frames)"
+    return None
+
+
+def wav_header(channels, sampwidth, sr, data_size):
+    """Build the canonical 44-byte PCM WAV header for data_size bytes of samples."""
+    frame_width = channels * sampwidth
+    return struct.pack('<4sI4s4sIHHIIHH4sI', b'RIFF', 36 + data_size, b'WAVE',
+                       b'fmt ', 16, 1, channels, sr, sr * frame_width, frame_width, sampwidth * 8,
+                       b'data', data_size)
+
+
+def copy_pcm_head(src_path, dst_path, trim_frames):
+    """
+    Copy the first trim_frames frames of a PCM WAV behind a fresh 44-byte header.
+    The data bytes go file-to-file with os.sendfile where the OS has it, so they
+    are never read into Python. Returns the number of frames written; raises
+    wave.Error for WAVs the wave module can't parse.
+    """
+    with open(src_path, 'rb') as src:
+        with wave.open(src) as w:
+            channels, sampwidth, sr = w.getnchannels(), w.getsampwidth(), w.getframerate()
+            frames = min(trim_frames, w.getnframes())
+            # wave.open stops right at the start of the data chunk
+            data_offset = src.tell()
+        
+        frame_width = channels * sampwidth
+        # A truncated file can hold fewer frames than its data chunk claims
+        available = (os.fstat(src.fileno()).st_size - data_offset) // frame_width
+        frames = max(0, min(frames, available))
+        data_size = frames * frame_width
+        
+        with open(dst_path, 'wb') as dst:
+            dst.write(wav_header(channels, sampwidth, sr, data_size))
+            dst.flush()
+            offset, remaining = data_offset, data_size
+            if hasattr(os, 'sendfile'):
+                while remaining:
+                    sent = os.sendfile(dst.fileno(), src.fileno(), offset, remaining)
+                    if not sent:
+                        break
+                    offset += sent
+                    remaining -= sent
+            else:
+                # No sendfile (Windows): copy in 1 MB blocks
+                src.seek(offset)
+                while remaining:
+                    block = src.read(min(remaining, 1 << 20))
+                    if not block:
+                        break
+                    dst.write(block)
+                    remaining -= len(block)
+            if remaining:
+                # The source shrank under us: size the header from what was copied
+                frames = (data_size - remaining) // frame_width
+                data_size = frames * frame_width
+                dst.truncate(WAV_HEADER_SIZE + data_size)
+                dst.seek(0)
+                dst.write(wav_header(channels, sampwidth, sr, data_size))
+                dst.seek(0, os.SEEK_END)
+            # RIFF chunks are word-aligned
+            if data_size & 1:
+                dst.write(b'\x00')
+    
+    return frames
+
+
+def copy_decoded_head(src_path, dst_path, trim_frames, info):
+    """
+    Decode only the first trim_frames frames with libsndfile and write them as WAV,
+    keeping the source's sample format when WAV can hold it. Returns the frame count.
+    """
+    data, _ = sf.read(src_path, frames=trim_frames, dtype='float64', always_2d=True)
+    subtype = info.subtype if sf.check_format('WAV', info.subtype) else None
+    sf.write(dst_path, data, info.samplerate, subtype=subtype)
+    return len(data)
+
+
+def trim_segment_to_word(analysis_folder, target_word="feliz", log=print):
     """
     Trim the segment to end at a specific word.
     
     Args:
         analysis_folder: Path to the analysis run folder
         target_word: Word to trim at (default: "feliz")
+        log: print-like function for the progress output
     """
     analysis_folder = Path(analysis_folder)
     
     # Load the analysis report
     report_path = analysis_folder / "analysis_report.json"
     if not report_path.exists():
-        print(f"❌ Error: Analysis report not found at {report_path}")
+        log(f"❌ Error: Analysis report not found at {report_path}")
         return
     
-    with open(report_path, 'r', encoding='utf-8') as f:
-        analysis = json.load(f)
+    with open(report_path, 'rb') as f:
+        analysis = orjson.loads(f.read())
     
-    # Find the target word
+    # Find the first occurrence of the target word
     word_timings = analysis['transcription']['word_timings']
-    target_word_data = None
-    
-    for word in word_timings:
-        if word['word'].lower() == target_word.lower():
-            target_word_data = word
-            break
+    target_lc = target_word.lower()
+    target_word_data = next((w for w in word_timings if w['word'].lower() == target_lc), None)
     
     if not target_word_data:
-        print(f"❌ Error: Word '{target_word}' not found in transcription")
-        print(f"Available words: {[w['word'] for w in word_timings]}")
+        log(f"❌ Error: Word '{target_word}' not found in transcription")
+        log(f"Available words: {[w['word'] for w in word_timings]}")
         return
     
     # Get the original segment file
     segment_file = Path(analysis['segment_file'])
     if not segment_file.exists():
-        print(f"❌ Error: Segment file not found at {segment_file}")
+        log(f"❌ Error: Segment file not found at {segment_file}")
         return
     
     # Calculate trim end time (end of the target word)
     trim_end_time = target_word_data['end']
+    orig_duration = analysis['audio_analysis']['duration']
+    segment_str = str(segment_file)
     
-    print(f"\n{'='*70}")
-    print(f"TRIMMING SEGMENT TO END AT '{target_word.upper()}'")
-    print(f"{'='*70}")
-    print(f"\nOriginal segment: {segment_file.name}")
-    print(f"Original duration: {analysis['audio_analysis']['duration']:.2f}s")
-    print(f"Target word: '{target_word_data['word']}'")
-    print(f"Word position: {target_word_data['start']:.3f}s - {target_word_data['end']:.3f}s")
-    print(f"Trimming to: {trim_end_time:.3f}s")
-    
-    # Load audio and trim
-    audio = AudioSegment.from_wav(str(segment_file))
-    trimmed_audio = audio[:int(trim_end_time * 1000)]  # Convert to milliseconds
+    # Each block goes out as one write
+    log("\n".join([
+        "\n" + BANNER,
+        f"TRIMMING SEGMENT TO END AT '{target_word.upper()}'",
+        BANNER,
+        f"\nOriginal segment: {segment_file.name}",
+        f"Original duration: {orig_duration:.2f}s",
+        f"Target word: '{target_word_data['word']}'",
+        f"Word position: {target_word_data['start']:.3f}s - {target_word_data['end']:.3f}s",
+        f"Trimming to: {trim_end_time:.3f}s"
+    ]))
     
-    # Save trimmed version
     trimmed_filename = segment_file.stem + "_trimmed.wav"
     trimmed_path = analysis_folder / trimmed_filename
-    trimmed_audio.export(str(trimmed_path), format="wav")
+    trimmed_str = str(trimmed_path)
     
-    actual_duration = len(trimmed_audio) / 1000.0
-    print(f"\n✓ Trimmed segment saved: {trimmed_filename}")
-    print(f"✓ New duration: {actual_duration:.3f}s")
+    # Check the header before reading any samples
+    try:
+        info = sf.info(segment_str)
+    except RuntimeError as e:
+        log(f"❌ Error: Can't read segment header: {e}")
+        return
+    
+    sr = info.samplerate
+    trim_frames = int(trim_end_time * sr)
+    problem = header_problem(info, trim_frames)
+    if problem:
+        log(f"❌ Error: {segment_file.name}: {problem}")
+        return
+    
+    if info.format == 'WAV':
+        try:
+            # PCM WAV (the usual case): the trim is a prefix cut, so copy the raw frames without decoding them
+            frames = copy_pcm_head(segment_str, trimmed_str, trim_frames)
+        except wave.Error:
+            # Float/extensible WAVs the wave module can't parse
+            frames = copy_decoded_head(segment_str, trimmed_str, trim_frames, info)
+    else:
+        # Other containers (FLAC, OGG, ...) have to be decoded
+        frames = copy_decoded_head(segment_str, trimmed_str, trim_frames, info)
+    
+    actual_duration = frames / sr
+    log(f"\n✓ Trimmed segment saved: {trimmed_filename}\n✓ New duration: {actual_duration:.3f}s")
     
     # Filter word segments and timings to only include up to target word
     target_index = target_word_data['index']
-    filtered_words = [w for w in word_timings if w['index'] <= target_index]
-    filtered_word_segments = [w for w in analysis['word_segments'] if w['index'] <= target_index]
+    # Both lists are in index order, so the cut point is a binary search away
+    word_segments = analysis['word_segments']
+    filtered_words = word_timings[:bisect.bisect_right(word_timings, target_index, key=lambda w: w['index'])]
+    filtered_word_segments = word_segments[:bisect.bisect_right(word_segments, target_index, key=lambda w: w['index'])]
     
-    print(f"\n✓ Included words: {len(filtered_words)} (from {word_timings[0]['word']} to {target_word_data['word']})")
-    
-    # Create updated analysis report
-    updated_analysis = analysis.copy()
-    updated_analysis['segment_file'] = str(trimmed_path)
-    updated_analysis['segment_range']['end'] = analysis['segment_range']['start'] + trim_end_time
-    updated_analysis['segment_range']['duration'] = trim_end_time
-    updated_analysis['audio_analysis']['duration'] = trim_end_time
-    updated_analysis['transcription']['word_timings'] = filtered_words
-    updated_analysis['word_segments'] = filtered_word_segments
-    updated_analysis['summary']['total_words'] = len(filtered_words)
+    log(f"\n✓ Included words: {len(filtered_words)} (from {word_timings[0]['word']} to {target_word_data['word']})")
     
     # Update full text to only include filtered words
     updated_text = ' '.join([w['word'] for w in filtered_words])
-    updated_analysis['transcription']['full_text'] = updated_text
+    
+    # Create updated analysis report. The nested dicts are rebuilt rather than
+    # mutated, so the original analysis (and its duration below) stays intact.
+    updated_analysis = {
+        **analysis,
+        'segment_file': trimmed_str,
+        'segment_range': {
+            **analysis['segment_range'],
+            'end': analysis['segment_range']['start'] + trim_end_time,
+            'duration': trim_end_time
+        },
+        'audio_analysis': {**analysis['audio_analysis'], 'duration': trim_end_time},
+        'transcription': {
+            **analysis['transcription'],
+            'word_timings': filtered_words,
+            'full_text': updated_text
+        },
+        'word_segments': filtered_word_segments,
+        'summary': {**analysis['summary'], 'total_words': len(filtered_words)}
+    }
     
     # Save updated report
+    # Written to a temp file and renamed, so a killed run never leaves a half-written report
     updated_report_path = analysis_folder / "analysis_report_trimmed.json"
-    with open(updated_report_path, 'w', encoding='utf-8') as f:
-        json.dump(updated_analysis, f, indent=2, ensure_ascii=False)
-    
-    print(f"✓ Updated analysis report: analysis_report_trimmed.json")
-    
-    print(f"\n{'='*70}")
-    print(f"TRIMMING COMPLETE")
-    print(f"{'='*70}")
-    print(f"\n📊 Summary:")
-    print(f"   Trimmed segment: {trimmed_filename}")
-    print(f"   Duration: {actual_duration:.3f}s (was {analysis['audio_analysis']['duration']:.2f}s)")
-    print(f"   Words included: {len(filtered_words)}")
-    print(f"   Text: {updated_text}")
-    print(f"   Updated report: {updated_report_path.name}")
-    print(f"\n✓ Ready for translation with clean ending at '{target_word_data['word']}'!")
-    print(f"{'='*70}\n")
+    tmp_path = updated_report_path.with_suffix(".json.tmp")
+    with open(tmp_path, 'wb') as f:
+        f.write(orjson.dumps(updated_analysis, option=orjson.OPT_INDENT_2))
+    os.replace(tmp_path, updated_report_path)
+    
+    # One word per line, so later steps can stream the timings without parsing the report
+    with open(analysis_folder / "word_timings_trimmed.jsonl", 'wb') as f:
+        f.writelines(orjson.dumps(w, option=orjson.OPT_APPEND_NEWLINE) for w in filtered_words)
+    
+    log("✓ Updated analysis report: analysis_report_trimmed.json")
+    log("✓ Word timings: word_timings_trimmed.jsonl")
+    
+    log("\n".join([
+        "\n" + BANNER,
+        "TRIMMING COMPLETE",
+        BANNER,
+        "\n📊 Summary:",
+        f"   Trimmed segment: {trimmed_filename}",
+        f"   Duration: {actual_duration:.3f}s (was {orig_duration:.2f}s)",
+        f"   Words included: {len(filtered_words)}",
+        f"   Text: {updated_text}",
+        "   Updated report: analysis_report_trimmed.json",
+        f"\n✓ Ready for translation with clean ending at '{target_word_data['word']}'!",
+        BANNER + "\n"
+    ]))
     
     return trimmed_path
 
 
+def trim_batch(analysis_folders, target_word="feliz"):
+    """
+    Trim several analysis runs concurrently. Each run only reads and writes
+    its own folder, so the jobs share no state.
+    Returns the trimmed paths (None for runs that failed), in input order.
+    """
+    def run(folder):
+        out = io.StringIO()
+        path = trim_segment_to_word(folder, target_word=target_word, log=functools.partial(print, file=out))
+        return path, out.getvalue()
+    
+    # Each run's output is collected and written in one piece, in input order,
+    # so concurrent runs never interleave their banners and errors
+    paths = []
+    with ThreadPoolExecutor(max_workers=min(len(analysis_folders), os.cpu_count() or 1)) as pool:
+        for path, output in pool.map(run, analysis_folders):
+            sys.stdout.write(output)
+            sys.stdout.flush()
+            paths.append(path)
+    return paths
+
+
 def main():
+    parser = argparse.ArgumentParser(description="Trim analysis segments to end at a target word.")
+    parser.add_argument("runs", nargs="*", help="Analysis run folders (default: latest data/analysis/run_*)")
+    parser.add_argument("--word", default="feliz", help="Word to end the segment at")
+    parser.add_argument("--all", action="store_true", help="Trim every data/analysis/run_* folder")
+    args = parser.parse_args()
+    if args.all and args.runs:
+        parser.error("--all can't be combined with explicit run folders")
+    
+    if args.runs:
+        trim_batch(args.runs, target_word=args.word)
+        return
+    
     workspace_root = Path(__file__).parent
     
     # Find the most recent analysis folder
@@ -121,21 +302,25 @@ def main():
         print("Please run analyze_vocals_precise.py first!")
         return
     
-    # Get all run folders
-    run_folders = sorted([f for f in analysis_base.iterdir() if f.is_dir() and f.name.startswith("run_")])
+    with os.scandir(analysis_base) as entries:
+        run_entries = [e for e in entries if e.name.startswith("run_") and e.is_dir()]
     
-    if not run_folders:
+    if not run_entries:
         print("❌ Error: No analysis runs found")
         print("Please run analyze_vocals_precise.py first!")
         return
     
-    # Use the most recent run
-    latest_run = run_folders[-1]
+    if args.all:
+        print(f"\n📁 Trimming {len(run_entries)} analysis runs")
+        trim_batch(sorted(e.path for e in run_entries), target_word=args.word)
+        return
+    
+    # Use the most recent run (run_<timestamp> names sort chronologically)
+    latest_run = max(run_entries, key=lambda e: e.name)
     
     print(f"\n📁 Using analysis run: {latest_run.name}")
     
-    # Trim to "feliz"
-    trim_segment_to_word(latest_run, target_word="feliz")
+    trim_segment_to_word(latest_run.path, target_word=args.word)
 
 
 if __name__ == "__main__":